@@ -0,0 +1,292 @@
+"""Замеры производительности на фиксированных сценариях.
+
+    python benchmark.py                      # все сценарии без окна
+    python benchmark.py --render             # с отрисовкой в скрытом окне
+    python benchmark.py -o new.json --compare old.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import arcade
+
+from main import (ASSETS, MIXER, SCREEN_HEIGHT, SCREEN_TITLE, SCREEN_WIDTH, SIMULATION_STEP, HeadlessRunner,
+                  MenuView, MyGame)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SEED = 1234
+
+
+def percentile(values, q):
+    """Перцентиль по ближайшему рангу"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summary(values):
+    if not values:
+        return None
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+        "mean": sum(values) / len(values),
+    }
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def storm_keys(tick):
+    """Уровень 1: бегаем туда-сюда под бомбами, стреляем вверх и прыгаем"""
+    keys = {arcade.key.LCTRL}
+    keys.add(arcade.key.RIGHT if tick // 90 % 2 == 0 else arcade.key.LEFT)
+    if tick // 60 % 2 == 0:
+        keys.add(arcade.key.W)
+    if tick % 45 == 0:
+        keys.add(arcade.key.SPACE)
+    return keys
+
+
+def boss_keys(tick):
+    """Уровень 2: стреляем в босса, прыгаем и иногда делаем рывок"""
+    keys = {arcade.key.LCTRL}
+    if tick // 120 % 3 == 1:
+        keys.add(arcade.key.RIGHT)
+    elif tick // 120 % 3 == 2:
+        keys.add(arcade.key.LEFT)
+    if tick % 50 == 0:
+        keys.add(arcade.key.SPACE)
+    if tick % 240 == 0:
+        keys.add(arcade.key.LSHIFT)
+    return keys
+
+
+class Recorder:
+    """Собирает время кадра, тика и чистый прирост блоков памяти за кадр: выделенные минус освобождённые
+    по sys.getallocatedblocks, а не число выделений"""
+
+    def __init__(self):
+        self.frame_ms = []
+        self.tick_ms = []
+        self.net_blocks = []
+
+    def measure(self, tick, draw=None):
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        tick()
+        ticked = time.perf_counter()
+        if draw is not None:
+            draw()
+        finished = time.perf_counter()
+        self.tick_ms.append((ticked - start) * 1000)
+        self.frame_ms.append((finished - start) * 1000)
+        self.net_blocks.append(sys.getallocatedblocks() - blocks)
+
+    def result(self, **extra):
+        return {
+            "frames": len(self.frame_ms),
+            "frame_ms": summary(self.frame_ms),
+            "tick_ms": summary(self.tick_ms),
+            "net_blocks_per_frame": summary(self.net_blocks),
+            **extra,
+        }
+
+
+def make_window():
+    return arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE, visible=False)
+
+
+def make_level(level, render):
+    """Уровень без звука, прокрученный до конца отсчёта"""
+    ASSETS.silent = True
+    random.seed(SEED)
+    if render:
+        window = make_window()
+        game = MyGame(level=level)
+        game.setup()
+        window.show_view(game)
+    else:
+        game = HeadlessRunner(level, seed=SEED, effects=True).simulation
+    while not game.game_started:
+        game.step(SIMULATION_STEP)
+    return game
+
+
+def finished(game):
+    return game.game_over and game.game_over_timer >= 2
+
+
+def run_level(level, seconds, keys_for_tick, render, before_tick=None):
+    game = make_level(level, render)
+    recorder = Recorder()
+    draw = game.on_draw if render else None
+
+    for tick in range(int(seconds / SIMULATION_STEP)):
+        if finished(game):
+            break
+        game.set_keys(keys_for_tick(tick))
+        if before_tick is not None:
+            before_tick(game, tick)
+        recorder.measure(lambda: game.step(SIMULATION_STEP), draw)
+        if game.player.health < 3 and not game.game_over:
+            game.player.health = 3
+            game.player.texture_hp = game.player.hp_list[3]
+    return recorder.result(pools=game.pool_stats(), projectiles=game.projectile_stats(),
+                           particles=game.particles.stats(), collisions=game.collision_stats(),
+                           ai=game.ai.stats(), audio=MIXER.stats(), bombs_destroyed=game.bombs_destroyed)
+
+
+def level1_bomb_storm(render):
+    return run_level(1, 90, storm_keys, render)
+
+
+def level2_boss_fight(render):
+    return run_level(2, 180, boss_keys, render)
+
+
+def explosion_burst(render):
+    def burst(game, tick):
+        if tick % 30 == 0:
+            for _ in range(20):
+                game.create_explosion_effect(random.randint(0, SCREEN_WIDTH), random.randint(300, SCREEN_HEIGHT))
+
+    return run_level(1, 10, lambda tick: set(), render, before_tick=burst)
+
+
+def bullet_hell(render):
+    """Уровень 1 под дождём из десятков бомб за тик, на экране держится несколько тысяч снарядов.
+    Герой стоит и стреляет вверх, над ним коридор без бомб, иначе он погибает за пару тиков"""
+    def rain(game, tick):
+        hero_x = game.player.center_x
+        for _ in range(40):
+            x = random.randint(0, SCREEN_WIDTH - 300)
+            if x > hero_x - 150:
+                x += 300
+            game.bombs.spawn("bomb", x, SCREEN_HEIGHT + 50, velocity_y=-random.randint(300, 700))
+
+    return run_level(1, 10, lambda tick: {arcade.key.LCTRL, arcade.key.W}, render, before_tick=rain)
+
+
+def menu_idle(render):
+    if not render:
+        return {"skipped": "menu needs a window, run with --render"}
+    ASSETS.silent = True
+    random.seed(SEED)
+    window = make_window()
+    menu = MenuView()
+    window.show_view(menu)
+    recorder = Recorder()
+    for _ in range(int(10 / SIMULATION_STEP)):
+        recorder.measure(lambda: menu.on_update(SIMULATION_STEP), menu.on_draw)
+    return recorder.result()
+
+
+SCENARIOS = {
+    "level1_bomb_storm": level1_bomb_storm,
+    "level2_boss_fight": level2_boss_fight,
+    "menu_idle": menu_idle,
+    "explosion_burst": explosion_burst,
+    "bullet_hell": bullet_hell,
+}
+
+
+def run_child(name, render):
+    """Один сценарий в этом процессе, чтобы пиковый RSS не смешивался с другими"""
+    result = SCENARIOS[name](render)
+    if "skipped" not in result:
+        result["peak_rss_kb"] = peak_rss_kb()
+    json.dump(result, sys.stdout)
+
+
+def run_all(names, render):
+    results = {}
+    for name in names:
+        command = [sys.executable, __file__, "--child", name]
+        if render:
+            command.append("--render")
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            results[name] = {"error": completed.stderr.strip().splitlines()[-1:]}
+        else:
+            results[name] = json.loads(completed.stdout)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "arcade": arcade.version.VERSION,
+            "render": render,
+            "seed": SEED,
+        },
+        "scenarios": results,
+    }
+
+
+def compare(report, baseline):
+    """Печатает изменение p50/p95/p99 относительно прошлого прогона"""
+    for name, result in report["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old or not result.get("frame_ms") or not old.get("frame_ms"):
+            continue
+        changes = []
+        for key in ("p50", "p95", "p99"):
+            before, after = old["frame_ms"][key], result["frame_ms"][key]
+            if before:
+                changes.append(f"{key} {before:.3f} -> {after:.3f} ms ({(after - before) / before * 100:+.1f}%)")
+        print(f"{name}: " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"по умолчанию все: {', '.join(SCENARIOS)}")
+    parser.add_argument("--render", action="store_true", help="рисовать кадры в скрытом окне")
+    parser.add_argument("-o", "--output", default="bench_output.json")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.render)
+        return
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    report = run_all(args.scenarios or list(SCENARIOS), args.render)
+    with open(args.output, mode='w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in report["scenarios"].items():
+        frame = result.get("frame_ms")
+        if frame:
+            print(f"{name}: {result['frames']} frames, p50 {frame['p50']:.3f} ms, p95 {frame['p95']:.3f} ms, "
+                  f"p99 {frame['p99']:.3f} ms, net block growth {result['net_blocks_per_frame']['mean']:+.1f}/frame, "
+                  f"peak RSS {result.get('peak_rss_kb')} KB")
+        else:
+            print(f"{name}: {result.get('skipped') or result.get('error')}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Сборка атласов: кадры героя, босса, монет и табличек HP складываются в несколько листов,
+а положение, хитбокс и размер исходного файла каждого кадра пишутся в data/atlas/index.json.
+Его читает AssetCache; кадр, чей PNG с тех пор поменял размер, грузится из файла с предупреждением.
+
+    python build_atlas.py
+
+Запускать заново после правки любого кадра в этих папках.
+"""
+import json
+import os
+
+from PIL import Image
+from arcade import hitbox
+
+ATLAS_DIR = 'data/atlas'
+ATLAS_INDEX = os.path.join(ATLAS_DIR, 'index.json')
+SHEETS = {
+    'hero': 'data/hero',
+    'gupi': 'data/enemy/gupi',
+    'coins': 'data/coins',
+    'hp': 'data/HP_table',
+}
+MAX_SHEET_WIDTH = 2048
+PADDING = 2
+
+
+def frame_paths(folder):
+    """PNG-кадры папки без резервных копий *.png~"""
+    return sorted(os.path.join(folder, name).replace(os.sep, '/') for name in os.listdir(folder)
+                  if name.lower().endswith('.png'))
+
+
+def pack(images):
+    """Раскладка полками: кадры по убыванию высоты слева направо, новая полка когда не влезает"""
+    positions = {}
+    x = y = shelf_height = width = 0
+    for path, image in sorted(images.items(), key=lambda item: (-item[1].height, item[0])):
+        if x and x + image.width > MAX_SHEET_WIDTH:
+            x = 0
+            y += shelf_height + PADDING
+            shelf_height = 0
+        positions[path] = (x, y)
+        x += image.width + PADDING
+        width = max(width, x - PADDING)
+        shelf_height = max(shelf_height, image.height)
+    return positions, (width, y + shelf_height)
+
+
+def build_sheet(name, folder):
+    images = {path: Image.open(path).convert('RGBA') for path in frame_paths(folder)}
+    positions, size = pack(images)
+
+    sheet = Image.new('RGBA', size, (0, 0, 0, 0))
+    frames = {}
+    for path, (x, y) in positions.items():
+        image = images[path]
+        sheet.paste(image, (x, y))
+        frames[path] = {
+            "sheet": name,
+            "x": x,
+            "y": y,
+            "width": image.width,
+            "height": image.height,
+            "hit_box": [list(point) for point in hitbox.algo_default.calculate(image)],
+            "source_size": os.path.getsize(path),
+        }
+
+    sheet_path = f'{ATLAS_DIR}/{name}.png'
+    sheet.save(sheet_path, optimize=True)
+    print(f"{sheet_path}: {len(frames)} frames, {size[0]}x{size[1]}")
+    return sheet_path, frames
+
+
+def main():
+    os.makedirs(ATLAS_DIR, exist_ok=True)
+    index = {"sheets": {}, "frames": {}}
+    for name, folder in SHEETS.items():
+        sheet_path, frames = build_sheet(name, folder)
+        index["sheets"][name] = sheet_path
+        index["frames"].update(frames)
+
+    with open(ATLAS_INDEX, mode='w', encoding='utf-8') as f:
+        json.dump(index, f)
+
+
+if __name__ == '__main__':
+    main()
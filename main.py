@@ -1,13 +1,68 @@
 import enum
+import gc
+import json
 import math
 import os
+import queue
 import random
+import struct
 import sys
-import arcade
-from pyglet.graphics import Batch
-from arcade.gui import UIManager, UIFlatButton, UITextureButton
-from arcade.gui.widgets.layout import UIAnchorLayout, UIBoxLayout
-from arcade.gui.events import UIOnClickEvent
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
+
+STARTUP_BEGIN = time.perf_counter()
+
+import arcade  # noqa: E402
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+from pyglet import media  # noqa: E402
+from arcade.gl import BufferDescription  # noqa: E402
+from arcade.geometry import are_polygons_intersecting  # noqa: E402
+from arcade.gl.geometry import quad_2d_fs  # noqa: E402
+from pyglet.graphics import Batch  # noqa: E402
+from arcade.gui import UIManager, UIFlatButton, UITextureButton  # noqa: E402
+from arcade.gui.widgets.layout import UIAnchorLayout, UIBoxLayout  # noqa: E402
+from arcade.gui.events import UIOnClickEvent  # noqa: E402
+
+
+class StartupReport:
+    """Время запуска по этапам: импорты, код модуля, окно, меню, первый кадр и отложенные загрузки"""
+
+    def __init__(self, begin):
+        self.begin = begin
+        self.last = begin
+        self.stages = []
+        self.time_to_first_frame = None
+        self.enabled = False
+        self.finished = False
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.stages.append((name, now - self.last))
+        self.last = now
+
+    def first_frame(self):
+        """Вызывается после первого показанного кадра меню, возвращает False при повторных вызовах"""
+        if self.finished:
+            return False
+        self.finished = True
+        self.mark("first frame")
+        self.time_to_first_frame = self.last - self.begin
+        return True
+
+    def report(self):
+        if not self.enabled:
+            return
+        stages = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.stages)
+        print(f"startup: time to first frame {self.time_to_first_frame * 1000:.0f} ms ({stages}); "
+              f"asset loads {ASSETS.load_time * 1000:.0f} ms in {ASSETS.misses} files")
+
+
+STARTUP = StartupReport(STARTUP_BEGIN)
+STARTUP.mark("imports")
 
 SCREEN_WIDTH = 1400
 SCREEN_HEIGHT = 1000
@@ -15,9 +70,36 @@ SCREEN_TITLE = "CupHead"
 ANIMATION_SPEED_COIN = 0.1
 GRAVITY = 1.1
 FIRE_RATE = 0.2
+BULLET_SPEED = 1300
 PLAYER_JUMP_SPEED = 25
+SIMULATION_RATE = 60
+SIMULATION_STEP = 1 / SIMULATION_RATE
+AI_RATE = 20
+MAX_FRAME_TIME = 0.25
+MAX_TRACE_EVENTS = 500_000
+PROFILER_SMOOTHING = 0.05
+PARTICLE_CAPACITY = 4096
+PROJECTILE_CAPACITY = 256
+COLLISION_CELL_SIZE = 128
+RECORDING_PATH = None
 COLOR = arcade.color.WHITE
-CLICK_SOUND = arcade.load_sound('data/song/change_view.wav')
+ASSET_BUDGET_BYTES = 256 * 1024 * 1024
+LOADER_SLICE = 0.004
+LEVEL_TRANSITION_TIME = 1.5
+ATLAS_INDEX = 'data/atlas/index.json'
+LEVELS_DIR = 'data/levels'
+SPAWN_KINDS = ("bomb",)
+SOUND_EXTENSIONS = ('.wav', '.ogg', '.flac', '.mp3')
+COMPRESSED_SOUND_EXTENSIONS = ('.ogg', '.flac', '.mp3')
+STREAMING_MIN_BYTES = 512 * 1024
+VOICE_LIMITS = {
+    "ui": 2,
+    "weapon": 2,
+    "explosion": 4,
+    "hero": 3,
+    "boss": 2,
+    "pickup": 2,
+}
 STYLE_BUTTON = {
     "normal": UIFlatButton.UIStyle(
         font_name='Gill Sans',
@@ -40,6 +122,599 @@ STYLE_BUTTON = {
 }
 
 
+class FaceDirection(enum.Enum):
+    LEFT = 0
+    RIGHT = 1
+    UP = 2
+
+
+class Collider(enum.Enum):
+    BOSS = 1
+    COIN = 2
+
+
+class GupiState(enum.Enum):
+    IDLE = 0
+    PREPARING = 1
+    JUMPING = 2
+    LANDING = 3
+
+
+class SilentPlayer:
+    """Заглушка плеера для прогона без звука"""
+    volume = 0.0
+    playing = False
+
+    def play(self):
+        pass
+
+    def pause(self):
+        pass
+
+    def delete(self):
+        pass
+
+
+class SilentSound(arcade.Sound):
+    """Звук, который ничего не декодирует и не проигрывает"""
+
+    def __init__(self):
+        self.file_name = ''
+
+    def play(self, volume=1.0, pan=0.0, loop=False, speed=1.0):
+        return SilentPlayer()
+
+    def stop(self, player):
+        pass
+
+    def get_length(self):
+        return 0.0
+
+
+class StreamedSound:
+    """Длинный звук или музыка: файл читается с диска небольшими буферами и целиком в памяти не лежит.
+    Потоковый источник можно играть только один раз, поэтому каждый play открывает файл заново"""
+
+    def __init__(self, path):
+        self.file_name = path
+
+    def play(self, volume=1.0, pan=0.0, loop=False, speed=1.0):
+        sound = arcade.load_sound(self.file_name, streaming=True)
+        return sound.play(volume=volume, pan=pan, loop=loop, speed=speed)
+
+    def stop(self, player):
+        arcade.stop_sound(player)
+
+    def get_length(self):
+        return arcade.load_sound(self.file_name, streaming=True).get_length()
+
+
+class AssetCache:
+    """Общий кэш текстур и звуков: каждый файл грузится один раз, старые вытесняются по LRU.
+    Кадры, собранные build_atlas.py, вырезаются из листов атласа с готовыми хитбоксами"""
+
+    def __init__(self, budget_bytes=ASSET_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+        self.silent = False
+        self.atlas = None
+        self.sheets = {}
+        self.atlas_lock = threading.Lock()
+        self.requested = None
+
+    def texture(self, path):
+        """Текстура из кэша или с диска"""
+        self._request(path)
+        return self._get(path, self._load_texture)
+
+    def sound(self, path):
+        """Звук из кэша или с диска"""
+        self._request(path)
+        if self.silent:
+            return SILENT_SOUND
+        return self._get(path, self._load_sound)
+
+    def facing(self, path, faces=None):
+        """Таблица {направление: текстура} из исходной и отражённой копии;
+        хитбокс каждой текстуры отражается вместе с ней"""
+        self._request(path)
+        return self._get(f'{path}#facing#{faces}', lambda key: self._load_facing(path, faces))
+
+    def animation(self, paths, frame_time, loop=True):
+        """Общая для всех спрайтов таблица кадров из текстур"""
+        for path in paths:
+            self._request(path)
+        return self._get(f"{'|'.join(paths)}#{frame_time}#{loop}",
+                         lambda key: (FrameTable([self.texture(path) for path in paths], frame_time, loop), 0))
+
+    def facing_animation(self, paths, frame_time, loop=True, faces=None):
+        """Таблица кадров, где каждый кадр - таблица {направление: текстура}"""
+        for path in paths:
+            self._request(path)
+        return self._get(f"{'|'.join(paths)}#facing#{faces}#{frame_time}#{loop}",
+                         lambda key: (FrameTable([self.facing(path, faces) for path in paths], frame_time, loop), 0))
+
+    def preload(self, manifest):
+        """Заранее загружает все файлы из списка уровня"""
+        for path in manifest:
+            if path.lower().endswith(SOUND_EXTENSIONS):
+                self.sound(path)
+            else:
+                self.texture(path)
+
+    def missing(self, manifest):
+        """Файлы из списка, которых ещё нет в кэше"""
+        return [path for path in manifest
+                if path not in self.entries and not (self.silent and path.lower().endswith(SOUND_EXTENSIONS))]
+
+    def unlisted(self, manifest, build):
+        """Вызывает build и возвращает его результат и файлы, которые он запросил мимо списка manifest"""
+        self.requested = set()
+        try:
+            result = build()
+        finally:
+            requested, self.requested = self.requested, None
+        return result, sorted(requested - set(manifest))
+
+    def decode(self, path):
+        """Чтение файла без обращения к кэшу и GL, можно вызывать из другого потока"""
+        if path.lower().endswith(SOUND_EXTENSIONS):
+            return self._load_sound(path)
+        return self._load_texture(path)
+
+    def store(self, path, asset, size):
+        """Кладёт в кэш уже загруженный файл"""
+        if path not in self.entries:
+            self.entries[path] = (asset, size)
+            self.bytes_used += size
+            self._evict()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "load_ms": self.load_time * 1000,
+            "entries": len(self.entries),
+            "atlas_sheets": len(self.sheets),
+            "bytes": self.bytes_used,
+            "budget": self.budget_bytes,
+        }
+
+    def _request(self, path):
+        if self.requested is not None:
+            self.requested.add(path)
+
+    def _get(self, path, loader):
+        entry = self.entries.get(path)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(path)
+            return entry[0]
+
+        self.misses += 1
+        start = time.perf_counter()
+        asset, size = loader(path)
+        self.load_time += time.perf_counter() - start
+        self.store(path, asset, size)
+        return asset
+
+    def _evict(self):
+        """Выкидывает самые давно использованные файлы, пока не влезем в бюджет"""
+        while self.bytes_used > self.budget_bytes and len(self.entries) > 1:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.bytes_used -= size
+            self.evictions += 1
+
+    def _load_texture(self, path):
+        frame = self._atlas_frame(path)
+        if frame is None:
+            texture = arcade.load_texture(path)
+        else:
+            x, y = frame["x"], frame["y"]
+            image = self._atlas_sheet(frame["sheet"]).crop((x, y, x + frame["width"], y + frame["height"]))
+            texture = arcade.Texture(image, hit_box_points=[tuple(point) for point in frame["hit_box"]],
+                                     hash=f'atlas:{path}')
+        return texture, texture.width * texture.height * 4
+
+    def _atlas_frame(self, path):
+        """Место кадра в атласе или None, если атлас не собран, кадра в нём нет или исходный PNG
+        поменялся после сборки атласа"""
+        with self.atlas_lock:
+            if self.atlas is None:
+                try:
+                    with open(ATLAS_INDEX, encoding='utf-8') as f:
+                        self.atlas = json.load(f)
+                except (OSError, ValueError):
+                    self.atlas = {}
+            frames = self.atlas.get("frames", {})
+            frame = frames.get(path)
+            if frame is not None and os.path.exists(path) and os.path.getsize(path) != frame.get("source_size"):
+                print(f"warning: {path} changed after the atlas was built, loading it from the file; "
+                      "run build_atlas.py")
+                del frames[path]
+                frame = None
+            return frame
+
+    def _atlas_sheet(self, name):
+        """Лист атласа читается с диска один раз на все его кадры"""
+        with self.atlas_lock:
+            sheet = self.sheets.get(name)
+            if sheet is None:
+                sheet = Image.open(self.atlas["sheets"][name]).convert('RGBA')
+                self.sheets[name] = sheet
+            return sheet
+
+    def _load_facing(self, path, faces):
+        texture = self.texture(path)
+        flipped = texture.flip_horizontally()
+        if faces == FaceDirection.LEFT:
+            table = {FaceDirection.LEFT: texture, FaceDirection.RIGHT: flipped}
+        else:
+            table = {FaceDirection.RIGHT: texture, FaceDirection.LEFT: flipped}
+        return table, flipped.width * flipped.height * 4
+
+    @staticmethod
+    def _load_sound(path):
+        """Короткие звуки декодируются целиком, музыка, крупные звуки и сжатые форматы идут потоком.
+        Если рядом с .wav лежит .ogg или .flac с тем же именем, берётся сжатый файл"""
+        base = os.path.splitext(path)[0]
+        for extension in COMPRESSED_SOUND_EXTENSIONS:
+            if os.path.exists(base + extension):
+                path = base + extension
+                break
+        if path.lower().endswith(COMPRESSED_SOUND_EXTENSIONS) or os.path.getsize(path) >= STREAMING_MIN_BYTES:
+            return StreamedSound(path), 0
+        return arcade.load_sound(path), os.path.getsize(path)
+
+
+SILENT_SOUND = SilentSound()
+ASSETS = AssetCache()
+
+
+class Voice:
+    """Звук, который сейчас занимает место в группе микшера"""
+    __slots__ = ('player', 'sound', 'priority', 'started')
+
+    def __init__(self, player, sound, priority, started):
+        self.player = player
+        self.sound = sound
+        self.priority = priority
+        self.started = started
+
+
+class Mixer:
+    """Короткие эффекты по группам: в группе одновременно звучит не больше заданного числа голосов.
+    В полной группе новый звук вытесняет голос с меньшим или равным приоритетом (из равных - самый старый),
+    иначе отбрасывается. Плееры отыгравших голосов не удаляются, а берутся под следующие звуки"""
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.voices = {group: [] for group in limits}
+        self.idle = []
+        self.created = 0
+        self.played = 0
+        self.stolen = 0
+        self.dropped = 0
+
+    def play(self, sound, group, priority=0, volume=1.0):
+        """Проигрывает звук в группе; None, если голос не достался"""
+        if isinstance(sound, SilentSound):
+            self.played += 1
+            return None
+        voices = self.voices[group]
+        self._reap(voices)
+
+        player = None
+        if len(voices) >= self.limits[group]:
+            victim = min(voices, key=lambda voice: (voice.priority, voice.started))
+            if victim.priority > priority:
+                self.dropped += 1
+                return None
+            voices.remove(victim)
+            self.stolen += 1
+            if victim.sound is sound and isinstance(sound, arcade.Sound) and victim.player.source is not None:
+                player = victim.player
+                player.seek(0.0)
+            else:
+                self._release(victim)
+
+        if player is None:
+            player = self._player(sound)
+        player.volume = volume
+        player.play()
+        voices.append(Voice(player, sound, priority, time.perf_counter()))
+        self.played += 1
+        return player
+
+    def stats(self):
+        for voices in self.voices.values():
+            self._reap(voices)
+        return {
+            "active": sum(len(voices) for voices in self.voices.values()),
+            "groups": {group: len(voices) for group, voices in self.voices.items()},
+            "players": self.created,
+            "played": self.played,
+            "stolen": self.stolen,
+            "dropped": self.dropped,
+        }
+
+    def _player(self, sound):
+        """Плеер с поставленным в очередь звуком: свободный из запаса или новый"""
+        if not isinstance(sound, arcade.Sound):
+            return sound.play()
+        if self.idle:
+            player = self.idle.pop()
+        else:
+            player = media.Player()
+            self.created += 1
+        player.queue(sound.source)
+        return player
+
+    def _reap(self, voices):
+        """Голоса, у которых звук доиграл до конца, освобождают место в группе"""
+        for voice in [voice for voice in voices if voice.player.source is None]:
+            voices.remove(voice)
+            self._release(voice)
+
+    def _release(self, voice):
+        player = voice.player
+        if not isinstance(voice.sound, arcade.Sound):
+            arcade.stop_sound(player)
+            return
+        player.pause()
+        if player.source is not None:
+            player.next_source()
+        self.idle.append(player)
+
+
+MIXER = Mixer(VOICE_LIMITS)
+
+
+class LevelLoader:
+    """Фоновая загрузка уровня: файлы декодируются в отдельном потоке,
+    а в кэш и текстурный атлас попадают в главном потоке небольшими порциями"""
+
+    def __init__(self, ctx, manifest, build):
+        self.ctx = ctx
+        self.build = build
+        self.manifest = manifest
+        self.paths = ASSETS.missing(manifest)
+        self.done = 0
+        self.view = None
+        self.error = None
+        self.decoded = queue.Queue()
+        self.worker = threading.Thread(target=self.decode_all, daemon=True)
+        self.worker.start()
+
+    @property
+    def progress(self):
+        """Доля выполненной работы от 0 до 1, последний шаг - сборка уровня"""
+        return (self.done + (self.view is not None)) / (len(self.paths) + 1)
+
+    @property
+    def ready(self):
+        return self.view is not None
+
+    def decode_all(self):
+        try:
+            for path in self.paths:
+                self.decoded.put((path, *ASSETS.decode(path)))
+        except Exception as e:
+            self.error = e
+            self.decoded.put(None)
+
+    def pump(self, budget=LOADER_SLICE):
+        """Переносит готовые файлы в кэш, пока не кончится отведённое время кадра.
+        Ошибка чтения или сборки не выбрасывается, а остаётся в error"""
+        if self.error is not None:
+            return
+        start = time.perf_counter()
+        while self.done < len(self.paths) and time.perf_counter() - start < budget:
+            try:
+                item = self.decoded.get_nowait()
+            except queue.Empty:
+                return
+            if item is None:
+                return
+            path, asset, size = item
+            if isinstance(asset, arcade.Texture):
+                self.ctx.default_atlas.add(asset)
+            ASSETS.store(path, asset, size)
+            self.done += 1
+
+        if self.done == len(self.paths) and self.view is None and time.perf_counter() - start < budget:
+            try:
+                self.view, unlisted = ASSETS.unlisted(self.manifest, self.build)
+            except Exception as e:
+                self.error = e
+                return
+            if unlisted:
+                print(f"warning: level build loaded files missing from its assets list: {', '.join(unlisted)}")
+
+
+def set_facing_texture(sprite, table, direction):
+    """Ставит спрайту текстуру нужного направления, хитбокс пересчитывается только при смене текстуры"""
+    texture = table[direction]
+    if sprite.texture is not texture:
+        sprite.texture = texture
+        sprite.sync_hit_box_to_texture()
+
+
+class FrameTable:
+    """Неизменяемая последовательность кадров с длительностью кадра; одна на всех спрайтов"""
+    __slots__ = ('frames', 'frame_time', 'loop')
+
+    def __init__(self, frames, frame_time, loop=True):
+        self.frames = tuple(frames)
+        self.frame_time = frame_time
+        self.loop = loop
+
+    def frame_at(self, elapsed):
+        """Кадр по времени от начала анимации"""
+        if len(self.frames) == 1:
+            return self.frames[0]
+        index = int(elapsed / self.frame_time)
+        if self.loop:
+            return self.frames[index % len(self.frames)]
+        return self.frames[min(index, len(self.frames) - 1)]
+
+
+class Animation:
+    """Что сейчас играет у спрайта и с какого момента; своих счётчиков кадров нет"""
+    __slots__ = ('table', 'started')
+
+    def __init__(self):
+        self.table = None
+        self.started = 0.0
+
+    def play(self, table, now):
+        """Кадр таблицы на момент now, при смене таблицы она начинается с первого кадра"""
+        if table is not self.table:
+            self.table = table
+            self.started = now
+        return table.frame_at(now - self.started)
+
+    def stop(self):
+        self.table = None
+
+
+def animate(sprites, table, elapsed):
+    """Один и тот же кадр таблицы всем спрайтам списка за один проход"""
+    frame = table.frame_at(elapsed)
+    for sprite in sprites:
+        if sprite.texture is not frame:
+            sprite.texture = frame
+
+
+class LazySound:
+    """Звук, который читается с диска при первом проигрывании, а не при импорте"""
+
+    def __init__(self, path, group=None):
+        self.path = path
+        self.group = group
+
+    def play(self, volume=1.0, pan=0.0, loop=False, speed=1.0):
+        if self.group is not None:
+            return MIXER.play(ASSETS.sound(self.path), self.group, volume=volume)
+        return ASSETS.sound(self.path).play(volume=volume, pan=pan, loop=loop, speed=speed)
+
+
+CLICK_SOUND = LazySound('data/song/change_view.wav', group="ui")
+
+
+class ProfileScope:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+
+
+class NullScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_SCOPE = NullScope()
+
+
+class FrameProfiler:
+    """Замер фаз кадра: оверлей со скользящим средним (F3) и экспорт в Chrome trace"""
+
+    def __init__(self):
+        self.enabled = False
+        self.overlay = False
+        self.trace_path = None
+        self.trace_events = []
+        self.frame_totals = {}
+        self.averages = {}
+        self.overlay_lines = []
+        self.origin = time.perf_counter()
+
+    def scope(self, name):
+        """Замер блока with; пока профайлер выключен, возвращается пустышка"""
+        if not self.enabled:
+            return NULL_SCOPE
+        return ProfileScope(self, name)
+
+    def unmeasured(self, draw):
+        """Вызывает draw без замеров, чтобы отрисовка вне обычного кадра не попала в средние и trace"""
+        enabled, self.enabled = self.enabled, False
+        try:
+            draw()
+        finally:
+            self.enabled = enabled
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        self.enabled = self.overlay or self.trace_path is not None
+
+    def start_trace(self, path):
+        self.trace_path = path
+        self.enabled = True
+
+    def record(self, name, start, end):
+        self.frame_totals[name] = self.frame_totals.get(name, 0.0) + end - start
+        if self.trace_path is not None and len(self.trace_events) < MAX_TRACE_EVENTS:
+            self.trace_events.append({
+                "name": name,
+                "cat": name.split('.')[0],
+                "ph": "X",
+                "ts": (start - self.origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": 0,
+                "tid": 0,
+            })
+
+    def end_frame(self):
+        """Сдвигает скользящие средние на один кадр"""
+        if not self.enabled:
+            return
+        for name in self.averages.keys() | self.frame_totals.keys():
+            total = self.frame_totals.get(name, 0.0)
+            self.averages[name] = self.averages.get(name, total) * (1 - PROFILER_SMOOTHING) + total * PROFILER_SMOOTHING
+        self.frame_totals.clear()
+
+    def draw_overlay(self):
+        if not self.overlay:
+            return
+        rows = [f"{name:<18}{average * 1000:6.2f} ms" for name, average in sorted(self.averages.items())]
+        while len(self.overlay_lines) < len(rows):
+            self.overlay_lines.append(arcade.Text('', 20, SCREEN_HEIGHT - 30 - 20 * len(self.overlay_lines),
+                                                  arcade.color.YELLOW, 14, font_name="Courier New"))
+        for line, row in zip(self.overlay_lines, rows):
+            if line.text != row:
+                line.text = row
+            line.draw()
+
+    def dump_trace(self):
+        """Пишет накопленные события в формате trace_event (chrome://tracing, Perfetto)"""
+        if self.trace_path is None:
+            return
+        with open(self.trace_path, mode='w', encoding='utf-8') as f:
+            json.dump({"traceEvents": self.trace_events, "displayTimeUnit": "ms"}, f)
+
+
+PROFILER = FrameProfiler()
+
+
 def create_music_log(filename="all_music.txt"):
     music_info = [
         "Музыка, которая используется в проекте:\n",
@@ -68,70 +743,268 @@ def create_music_log(filename="all_music.txt"):
         "23. 'Enemy Hit1' - дополнительный звук урона врага"
     ]
 
+    content = "".join(line + "\n" for line in music_info)
+    try:
+        with open(filename, encoding='utf-8') as f:
+            if f.read() == content:
+                return
+    except (OSError, ValueError):
+        pass
+
     try:
         with open(filename, mode='w', encoding='utf-8') as f:
-            for line in music_info:
-                f.write(line + "\n")
+            f.write(content)
     except (ValueError, TypeError, FileNotFoundError) as e:
         exit(0)
 
 
+TV_VERTEX_SHADER = """
+#version 330
+
+in vec2 in_vert;
+
+void main() {
+    gl_Position = vec4(in_vert, 0.0, 1.0);
+}
+"""
+
+TV_FRAGMENT_SHADER = """
+#version 330
+
+uniform float u_time;
+uniform int u_frame;
+uniform float u_scanline_speed;
+uniform vec2 u_size;
+uniform float u_grain;
+uniform float u_scanlines;
+uniform float u_vignette;
+
+out vec4 f_color;
+
+uvec3 pcg3d(uvec3 v) {
+    v = v * 1664525u + 1013904223u;
+    v.x += v.y * v.z;
+    v.y += v.z * v.x;
+    v.z += v.x * v.y;
+    v ^= v >> 16u;
+    v.x += v.y * v.z;
+    v.y += v.z * v.x;
+    v.z += v.x * v.y;
+    return v;
+}
+
+void main() {
+    uvec3 h = pcg3d(uvec3(uvec2(gl_FragCoord.xy / 2.0), uint(u_frame)));
+    if (float(h.x) < u_grain * 4294967296.0) {
+        f_color = vec4(1.0, 1.0, 1.0, mix(0.12, 0.31, float(h.y) / 4294967296.0));
+        return;
+    }
+
+    float scroll = mod(u_time * u_scanline_speed, 4.0);
+    float scanline = mod(gl_FragCoord.y + scroll, 4.0) < 1.0 ? u_scanlines : 0.0;
+    vec2 uv = gl_FragCoord.xy / u_size - 0.5;
+    float vignette = smoothstep(0.35, 0.8, length(uv)) * u_vignette;
+    f_color = vec4(0.0, 0.0, 0.0, max(scanline, vignette));
+}
+"""
+
+
 class TVEffect:
-    """Класс для эффекта шума старых телевизоров"""
+    """Класс для эффекта шума старых телевизоров: зерно, бегущие строки и виньетка одним шейдером.
+    grain - сколько пылинок в среднем на кадр, scanline_speed - скорость строк в пикселях в секунду"""
+    program = None
+    quad = None
 
-    def __init__(self, width, height):
+    def __init__(self, width, height, grain=10, scanlines=0.05, scanline_speed=180, vignette=0.35):
         self.width = width
         self.height = height
-        self.scanline_offset = 0
+        self.grain = grain
+        self.scanlines = scanlines
+        self.scanline_speed = scanline_speed
+        self.vignette = vignette
+        self.start_time = time.perf_counter()
 
-    def update(self):
-        """Обновление эффектов"""
-        self.scanline_offset += 3
-        if self.scanline_offset > self.height:
-            self.scanline_offset = 0
+    def draw(self):
+        """Отрисовка эффектов поверх игры одним полноэкранным проходом"""
+        window = arcade.get_window()
+        if TVEffect.program is None:
+            TVEffect.program = window.ctx.program(vertex_shader=TV_VERTEX_SHADER,
+                                                  fragment_shader=TV_FRAGMENT_SHADER)
+            TVEffect.quad = quad_2d_fs()
+
+        width, height = window.get_framebuffer_size()
+        elapsed = time.perf_counter() - self.start_time
+        program = TVEffect.program
+        program['u_time'] = elapsed % 3600
+        program['u_frame'] = int(elapsed * 60) % (1 << 30)
+        program['u_scanline_speed'] = self.scanline_speed
+        program['u_size'] = width, height
+        program['u_grain'] = self.grain / ((width // 2) * (height // 2))
+        program['u_scanlines'] = self.scanlines
+        program['u_vignette'] = self.vignette
+        with window.ctx.enabled(window.ctx.BLEND):
+            TVEffect.quad.render(program)
+
+
+class FrameSnapshot:
+    """Кадр уровня, один раз отрисованный в текстуру: оверлеи паузы и итогов рисуют его одним проходом,
+    а не перерисовывают застывший уровень каждый кадр. Оверлей профайлера в снимок не попадает"""
+    quad = None
+
+    def __init__(self, view):
+        window = view.window
+        self.ctx = window.ctx
+        self.texture = self.ctx.texture(window.get_framebuffer_size())
+        framebuffer = self.ctx.framebuffer(color_attachments=[self.texture])
+        with framebuffer.activate():
+            framebuffer.clear()
+            PROFILER.unmeasured(view.draw_frame)
 
     def draw(self):
-        """Отрисовка эффектов поверх игры"""
-        for _ in range(random.randint(5, 15)):
-            x = random.randint(0, self.width)
-            y = random.randint(0, self.height)
-            size = random.randint(1, 2)
-            arcade.draw_circle_filled(
-                x, y, size,
-                (255, 255, 255, random.randint(30, 80))
-            )
+        if FrameSnapshot.quad is None:
+            FrameSnapshot.quad = quad_2d_fs()
+        self.texture.use(0)
+        with self.ctx.enabled_only():
+            FrameSnapshot.quad.render(self.ctx.utility_textured_quad_program)
+
+
+def stop_player(player):
+    """Останавливает плеер и убирает его из списка живых; заглушки тихого режима пропускаются"""
+    if isinstance(player, media.Player):
+        arcade.stop_sound(player)
+
+
+class LeakCheck:
+    """Отладка переходов между экранами (--debug-views): после перехода считает живые экраны, GL-текстуры
+    и звуковые плееры и предупреждает, если при повторном входе на тот же экран их стало больше"""
+
+    def __init__(self):
+        self.enabled = False
+        self.views = weakref.WeakSet()
+        self.baseline = {}
+
+    def track(self, view):
+        if self.enabled:
+            self.views.add(view)
+
+    def after_transition(self, view):
+        """Замер на следующем тике, когда прошлый экран уже никем не удерживается"""
+        if self.enabled:
+            arcade.schedule_once(lambda delta_time: self.check(view), 0)
+
+    def counts(self, ctx):
+        gc.collect()
+        ctx.gc()
+        created, freed = ctx.stats.texture
+        return {"views": len(self.views), "textures": created - freed, "players": len(media.Source._players)}
+
+    def check(self, view):
+        name = type(view).__name__
+        counts = self.counts(view.window.ctx)
+        baseline = self.baseline.setdefault(name, counts)
+        grown = [f"{key} {baseline[key]} -> {value}" for key, value in counts.items() if value > baseline[key]]
+        print(f"views: {name} {counts}")
+        if grown:
+            print(f"warning: {name} entered again with more live objects: {', '.join(grown)}")
+            self.baseline[name] = {key: max(value, baseline[key]) for key, value in counts.items()}
+
+
+LEAKS = LeakCheck()
+
+
+class Screen(arcade.View):
+    """Экран игры с явным жизненным циклом: on_enter при показе, on_exit(next_view) при уходе.
+    В on_exit экран освобождает UI, звуки и спрайты, которые следующему экрану не нужны"""
+
+    def on_show_view(self):
+        LEAKS.track(self)
+        self.on_enter()
+
+    def on_enter(self):
+        pass
+
+    def on_exit(self, next_view):
+        pass
+
+    def release_ui(self):
+        """Разбирает дерево виджетов. arcade.gui хранит значения свойств виджетов в WeakKeyDictionary,
+        и кнопка с замыканием на экран иначе держит и экран, и всё, что у него есть"""
+        self.manager.disable()
+        for widget in list(self.manager.walk_widgets(layer=None)):
+            widget.clear()
+        self.manager.clear()
+
+    def show(self, view):
+        """Переход на другой экран"""
+        self.window.show_view(view)
+        self.on_exit(view)
+        LEAKS.after_transition(view)
 
 
-class MenuView(arcade.View):
-    def __init__(self, music_sound=None, is_playing=False, camera_angle=0.0):
+class MenuMusic:
+    """Музыка меню: один плеер на главное меню и выбор уровня, после уровня запускается заново"""
+
+    def __init__(self):
+        self.player = None
+        self.muted = False
+
+    def start(self):
+        if self.player is None:
+            self.player = ASSETS.sound("data/song/Don_t-Deal-With-the-Devil.wav").play(loop=True, volume=0.3)
+            if self.muted:
+                self.player.pause()
+
+    def stop(self):
+        stop_player(self.player)
+        self.player = None
+
+    def toggle(self):
+        """Выключает или включает музыку, возвращает True, если теперь тихо"""
+        self.start()
+        self.muted = not self.muted
+        if self.muted:
+            self.player.pause()
+        else:
+            self.player.play()
+        return self.muted
+
+
+class ViewRegistry:
+    """Экраны меню строятся один раз: при возврате в меню берутся готовые, с тем же деревом виджетов"""
+
+    def __init__(self):
+        self.views = {}
+        self.music = MenuMusic()
+
+    def get(self, view_class):
+        view = self.views.get(view_class)
+        if view is None:
+            view = self.views[view_class] = view_class()
+        return view
+
+
+VIEWS = ViewRegistry()
+
+
+class MenuView(Screen):
+    def __init__(self):
         super().__init__()
-        self.background = arcade.load_texture('data/others/background_menu.png')
-        self.texture_sound_on = arcade.load_texture('data/others/music_on.png')
-        self.texture_sound_off = arcade.load_texture('data/others/music_off.png')
-        self.background_music = arcade.load_sound("data/song/Don_t-Deal-With-the-Devil.wav")
+        self.background = ASSETS.texture('data/others/background_menu.png')
+        self.texture_sound_on = ASSETS.texture('data/others/music_on.png')
+        self.texture_sound_off = ASSETS.texture('data/others/music_off.png')
+        self.frame_drawn = False
 
         self.tv_effect = TVEffect(SCREEN_WIDTH, SCREEN_HEIGHT)
 
         self.camera = arcade.Camera2D()
-        self.camera_angle = camera_angle
+        self.camera_angle = 0.0
         self.camera_speed = 0.4
         self.camera_center_x = SCREEN_WIDTH / 2
         self.camera_center_y = SCREEN_HEIGHT / 2
 
-        if music_sound is None:
-            self.background_player = self.background_music.play(loop=True, volume=0.3)
-        else:
-            self.background_player = music_sound
-
-        self.music_is_playing = is_playing
-
-        if not self.music_is_playing:
-            self.current_music_texture = self.texture_sound_on
-        else:
-            self.current_music_texture = self.texture_sound_off
+        self.music = VIEWS.music
 
         self.manager = UIManager()
-        self.manager.enable()
         self.anchor_layout = UIAnchorLayout()
         self.box_layout = UIBoxLayout(vertical=True, space_between=20)
 
@@ -140,9 +1013,21 @@ class MenuView(arcade.View):
         self.anchor_layout.add(self.box_layout, align_y=60)
         self.manager.add(self.anchor_layout)
 
+    def on_enter(self):
+        self.manager.enable()
+
+    def on_exit(self, next_view):
+        """Экран остаётся в VIEWS вместе с виджетами, поэтому только отключается"""
+        self.manager.disable()
+
     def on_update(self, delta_time):
-        """Обновление кругового движения камеры"""
-        self.tv_effect.update()
+        """Обновление кругового движения камеры; музыка меню грузится уже после первого кадра"""
+        if self.frame_drawn and self.music.player is None:
+            first_launch = STARTUP.first_frame()
+            self.music.start()
+            if first_launch:
+                STARTUP.mark("deferred loads")
+                STARTUP.report()
 
         jitter_x = random.uniform(-0.05, 0.05)
         jitter_y = random.uniform(-0.05, 0.05)
@@ -178,34 +1063,23 @@ class MenuView(arcade.View):
         @exit.event("on_click")
         def on_click_exit(event: UIOnClickEvent):
             CLICK_SOUND.play()
-            arcade.stop_sound(self.background_player)
+            self.music.stop()
             arcade.exit()
 
-        self.music_button = UITextureButton(texture=self.current_music_texture, x=20, y=20, width=150, height=50,
-                                            scale=0.25)
+        music_texture = self.texture_sound_off if self.music.muted else self.texture_sound_on
+        self.music_button = UITextureButton(texture=music_texture, x=20, y=20, width=150, height=50, scale=0.25)
         self.manager.add(self.music_button)
 
         @self.music_button.event("on_click")
         def on_click_music_button(event: UIOnClickEvent):
-            if not self.music_is_playing:
-                self.background_player.pause()
-                CLICK_SOUND.play()
-                self.music_button.texture, self.music_button.texture_hovered = (self.texture_sound_off,
-                                                                                self.texture_sound_off)
-                self.music_is_playing = True
-            else:
-                self.background_player.play()
-                CLICK_SOUND.play()
-                self.music_button.texture, self.music_button.texture_hovered = (self.texture_sound_on,
-                                                                                self.texture_sound_on)
-                self.music_is_playing = False
+            CLICK_SOUND.play()
+            texture = self.texture_sound_off if self.music.toggle() else self.texture_sound_on
+            self.music_button.texture, self.music_button.texture_hovered = texture, texture
 
     def start_game(self):
         """Функция запуска игры"""
-        game_view = Levels(self.background_player, self.music_button.texture, self.music_is_playing, self.camera_angle)
-        game_view.setup_widgets()
-        self.window.show_view(game_view)
-        self.manager.disable()
+        self.music.start()
+        self.show(VIEWS.get(Levels))
 
     def on_draw(self):
         self.clear()
@@ -215,59 +1089,60 @@ class MenuView(arcade.View):
                                                   self.background.height))
         self.manager.draw()
         self.tv_effect.draw()
+        self.frame_drawn = True
 
 
-class Levels(arcade.View):
-    def __init__(self, music_player, music_texture, is_playing=False, camera_angle=0.0):
+class Levels(Screen):
+    def __init__(self):
         super().__init__()
-        self.background = arcade.load_texture('data/others/background_menu.png')
-        self.background_player = music_player
-        self.music_is_playing = is_playing
-        self.music_texture = music_texture
-        self.level_start = arcade.load_sound('data/song/level_start.wav')
-        self.is_level_start = False
+        self.background = ASSETS.texture('data/others/background_menu.png')
+        self.music = VIEWS.music
+        self.level_start = ASSETS.sound('data/song/level_start.wav')
 
         self.tv_effect = TVEffect(SCREEN_WIDTH, SCREEN_HEIGHT)
 
         self.transition_active = False
         self.transition_timer = 0
         self.target_level = None
-        self.transition_view = None
+        self.loader = None
+        self.load_failed = False
+        self.loading_text = arcade.Text('', SCREEN_WIDTH / 2, 120, arcade.color.WHITE, 30, anchor_x="center",
+                                        font_name="Gill Sans")
 
         self.camera = arcade.Camera2D()
-        self.camera_angle = camera_angle
+        self.camera_angle = 0.0
         self.camera_speed = 0.4
         self.camera_center_x = SCREEN_WIDTH / 2
         self.camera_center_y = SCREEN_HEIGHT / 2
 
         self.manager = UIManager()
-        self.manager.enable()
         self.anchor_layout = UIAnchorLayout()
         self.box_layout = UIBoxLayout(vertical=True, space_between=20)
 
+        self.setup_widgets()
+
         self.anchor_layout.add(self.box_layout, align_y=60)
         self.manager.add(self.anchor_layout)
 
+    def on_enter(self):
+        self.load_failed = False
+        self.manager.enable()
+
+    def on_exit(self, next_view):
+        self.manager.disable()
+        self.loader = None
+
     def setup_widgets(self):
-        level_1 = UIFlatButton(text="Level 1",
-                               width=270,
-                               height=55,
-                               style=STYLE_BUTTON)
-        self.box_layout.add(level_1)
-
-        @level_1.event("on_click")
-        def on_click_level_1(event: UIOnClickEvent):
-            self.start_transition_to_level(1)
-
-        level_2 = UIFlatButton(text="Level 2",
-                               width=270,
-                               height=55,
-                               style=STYLE_BUTTON)
-        self.box_layout.add(level_2)
-
-        @level_2.event("on_click")
-        def on_click_level_2(event: UIOnClickEvent):
-            self.start_transition_to_level(2)
+        for number in available_levels():
+            level_button = UIFlatButton(text=load_level(number).name,
+                                        width=270,
+                                        height=55,
+                                        style=STYLE_BUTTON)
+            self.box_layout.add(level_button)
+
+            @level_button.event("on_click")
+            def on_click_level(event: UIOnClickEvent, number=number):
+                self.start_transition_to_level(number)
 
         exit = UIFlatButton(text="Exit to menu",
                             width=450,
@@ -280,14 +1155,10 @@ class Levels(arcade.View):
         @exit.event("on_click")
         def on_click_exit(event: UIOnClickEvent):
             CLICK_SOUND.play()
-            game_view = MenuView(self.background_player, self.music_is_playing, self.camera_angle)
-            self.window.show_view(game_view)
-            self.manager.disable()
+            self.show(VIEWS.get(MenuView))
 
     def on_update(self, delta_time):
         """Обновление логики с задержкой"""
-        self.tv_effect.update()
-
         jitter_x = random.uniform(-0.05, 0.05)
         jitter_y = random.uniform(-0.05, 0.05)
 
@@ -302,20 +1173,45 @@ class Levels(arcade.View):
         )
         if self.transition_active:
             self.transition_timer += delta_time
-
-            if self.transition_timer >= 1.5:
+            self.loader.pump()
+            if self.loader.error is not None:
+                self.cancel_transition(self.loader.error)
+                return
+            loading = f"Loading {int(self.loader.progress * 100)}%"
+            if self.loading_text.text != loading:
+                self.loading_text.text = loading
+
+            if self.transition_timer >= LEVEL_TRANSITION_TIME and self.loader.ready:
                 self.transition_active = False
-                self.window.show_view(self.transition_view)
-                self.transition_view = None
                 self.target_level = None
+                self.show(self.loader.view)
+
+    @staticmethod
+    def build_level(level_num):
+        """Сборка уровня, когда все его файлы уже в кэше"""
+        game_view = MyGame(level=level_num)
+        game_view.setup()
+        return game_view
+
+    def cancel_transition(self, error):
+        """Уровень не загрузился: ошибка пишется в консоль и под кнопками, меню уровней снова доступно"""
+        print(f"error: level {self.target_level} failed to load: {error!r}")
+        self.transition_active = False
+        self.target_level = None
+        self.loader = None
+        self.load_failed = True
+        self.loading_text.text = "Level failed to load"
+        self.music.start()
+        self.manager.enable()
 
     def start_transition_to_level(self, level_num):
-        """Запускает переход на указанный уровень с задержкой"""
+        """Запускает переход на указанный уровень, пока идёт пауза - грузит его в фоне"""
         if not self.transition_active:
-            arcade.stop_sound(self.background_player)
+            self.load_failed = False
+            self.music.stop()
             self.level_start.play()
-            self.transition_view = MyGame(level=level_num)
-            self.transition_view.setup()
+            self.loader = LevelLoader(self.window.ctx, load_level(level_num).assets,
+                                      lambda: self.build_level(level_num))
             self.transition_active = True
             self.transition_timer = 0
             self.target_level = level_num
@@ -330,24 +1226,26 @@ class Levels(arcade.View):
                                  arcade.rect.XYWH(self.center_x + 35, self.center_y, self.background.width + 30,
                                                   self.background.height))
         self.manager.draw()
+        if self.transition_active or self.load_failed:
+            self.loading_text.draw()
         self.tv_effect.draw()
 
 
-class GameOverView(arcade.View):
+class GameOverView(Screen):
     def __init__(self, game_view, sound, is_win=False):
         super().__init__()
         self.game_view = game_view
-        self.background = arcade.load_texture('data/others/options_menu.png')
+        self.snapshot = FrameSnapshot(game_view)
+        self.background = ASSETS.texture('data/others/options_menu.png')
         self.game_over_sound = sound
         self.is_win = is_win
         self.game_over_player = self.game_over_sound.play(volume=0.6)
-        self.coin_texture = arcade.load_texture('data/coins/coin1.png')
-        self.bomb_texture = arcade.load_texture('data/enemy/bomb.png')
+        self.coin_texture = ASSETS.texture('data/coins/coin1.png')
+        self.bomb_texture = ASSETS.texture('data/enemy/bomb.png')
 
         self.tv_effect = TVEffect(SCREEN_WIDTH, SCREEN_HEIGHT)
 
         self.manager = UIManager()
-        self.manager.enable()
         self.anchor_layout = UIAnchorLayout()
         self.box_layout = UIBoxLayout(vertical=True, space_between=20)
 
@@ -356,6 +1254,17 @@ class GameOverView(arcade.View):
         self.anchor_layout.add(self.box_layout, align_y=-40)
         self.manager.add(self.anchor_layout)
 
+    def on_enter(self):
+        self.manager.enable()
+
+    def on_exit(self, next_view):
+        """Уровень за экраном итогов больше не нужен"""
+        self.release_ui()
+        stop_player(self.game_over_player)
+        self.game_view.release()
+        self.game_view = None
+        self.snapshot = None
+
     def setup_widgets(self):
         if self.is_win:
             game_over_text = "YOU WIN!"
@@ -405,11 +1314,9 @@ class GameOverView(arcade.View):
         @retry.event("on_click")
         def on_click_retry(event):
             CLICK_SOUND.play()
-            self.game_over_player.delete()
             games_view = MyGame(level=self.game_view.current_level)
             games_view.setup()
-            self.window.show_view(games_view)
-            self.manager.disable()
+            self.show(games_view)
 
         self.box_layout.add(retry)
 
@@ -422,19 +1329,13 @@ class GameOverView(arcade.View):
         @exit.event("on_click")
         def on_click_exit(event):
             CLICK_SOUND.play()
-            self.game_over_player.delete()
-            menu_view = MenuView()
-            self.window.show_view(menu_view)
-            self.manager.disable()
+            self.show(VIEWS.get(MenuView))
 
         self.box_layout.add(exit)
 
-    def on_update(self, delta_time):
-        self.tv_effect.update()
-
     def on_draw(self):
         self.clear()
-        self.game_view.on_draw()
+        self.snapshot.draw()
         arcade.draw_rect_filled(arcade.rect.XYWH(
             SCREEN_WIDTH // 2,
             SCREEN_HEIGHT // 2,
@@ -450,7 +1351,7 @@ class GameOverView(arcade.View):
                                  arcade.rect.XYWH(SCREEN_WIDTH // 2 - 75, SCREEN_HEIGHT - 402, 44, 57))
         self.game_over_text.draw()
         self.score_text.draw()
-        if self.game_view.current_level == 1:
+        if self.game_view.level.has_spawns("bomb"):
             arcade.draw_texture_rect(self.bomb_texture,
                                      arcade.rect.XYWH(SCREEN_WIDTH // 2 - 75, SCREEN_HEIGHT - 322, 50, 50))
             self.bomb_text.draw()
@@ -459,13 +1360,14 @@ class GameOverView(arcade.View):
         self.tv_effect.draw()
 
 
-class PauseView(arcade.View):
+class PauseView(Screen):
     def __init__(self, game_view, background_player):
         super().__init__()
         self.game_view = game_view
+        self.snapshot = FrameSnapshot(game_view)
         self.batch = Batch()
-        self.background = arcade.load_texture('data/others/pause_menu.png')
-        self.pause_response = arcade.load_sound('data/song/pause_response.wav')
+        self.background = ASSETS.texture('data/others/pause_menu.png')
+        self.pause_response = ASSETS.sound('data/song/pause_response.wav')
         self.background_player = background_player
 
         self.tv_effect = TVEffect(SCREEN_WIDTH, SCREEN_HEIGHT)
@@ -475,7 +1377,6 @@ class PauseView(arcade.View):
         self.background_player.volume = self.pause_volume
 
         self.manager = UIManager()
-        self.manager.enable()
         self.anchor_layout = UIAnchorLayout()
         self.box_layout = UIBoxLayout(vertical=True, space_between=20)
 
@@ -484,6 +1385,17 @@ class PauseView(arcade.View):
         self.anchor_layout.add(self.box_layout, align_y=20)
         self.manager.add(self.anchor_layout)
 
+    def on_enter(self):
+        self.manager.enable()
+
+    def on_exit(self, next_view):
+        """Уровень освобождается, только если из паузы ушли не обратно в него"""
+        self.release_ui()
+        if next_view is not self.game_view:
+            self.game_view.release()
+        self.game_view = None
+        self.snapshot = None
+
     def setup_widgets(self):
         resume = UIFlatButton(text="Resume",
                               font_size=60,
@@ -496,7 +1408,7 @@ class PauseView(arcade.View):
         def on_click_resume(event):
             CLICK_SOUND.play()
             self.background_player.volume = self.original_volume
-            self.window.show_view(self.game_view)
+            self.show(self.game_view)
 
         self.box_layout.add(resume)
 
@@ -510,12 +1422,9 @@ class PauseView(arcade.View):
         @retry.event("on_click")
         def on_click_retry(event):
             CLICK_SOUND.play()
-            self.background_player.volume = self.original_volume
-            self.background_player.pause()
             games_view = MyGame(level=self.game_view.current_level)
             games_view.setup()
-            self.window.show_view(games_view)
-            self.manager.disable()
+            self.show(games_view)
 
         self.box_layout.add(retry)
 
@@ -530,19 +1439,13 @@ class PauseView(arcade.View):
         @exit.event("on_click")
         def on_click_exit(event):
             CLICK_SOUND.play()
-            self.background_player.volume = self.original_volume
-            self.background_player.pause()
-            menu_view = MenuView()
-            window.show_view(menu_view)
+            self.show(VIEWS.get(MenuView))
 
         self.box_layout.add(exit)
 
-    def on_update(self, delta_time):
-        self.tv_effect.update()
-
     def on_draw(self):
         self.clear()
-        self.game_view.on_draw()
+        self.snapshot.draw()
         arcade.draw_rect_filled(arcade.rect.XYWH(
             SCREEN_WIDTH // 2,
             SCREEN_HEIGHT // 2,
@@ -558,137 +1461,666 @@ class PauseView(arcade.View):
 
     def on_key_press(self, key, modifiers):
         if key == arcade.key.ESCAPE:
-            self.pause_response.play()
+            MIXER.play(self.pause_response, "ui")
             self.background_player.volume = self.original_volume
-            self.window.show_view(self.game_view)
+            self.show(self.game_view)
 
 
-class FaceDirection(enum.Enum):
-    LEFT = 0
-    RIGHT = 1
-    UP = 2
+class SpritePool:
+    """Пул переиспользуемых спрайтов одного типа"""
 
+    def __init__(self, factory, capacity=0):
+        self.factory = factory
+        self.free = []
+        self.allocated = 0
+        self.acquired = 0
+        self.released = 0
+        self.prewarm(capacity)
 
-class ExplosionParticle(arcade.SpriteCircle):
-    """Частица взрыва синего цвета"""
+    def prewarm(self, capacity):
+        """Заранее создаёт спрайты, чтобы в пуле их было не меньше capacity"""
+        while len(self.free) < capacity:
+            self.free.append(self._create())
 
-    def __init__(self, x, y):
-        color = (0, 191, 255, 255)
-        size = random.randint(3, 6)
-        super().__init__(size, color)
-        self.center_x = x
-        self.center_y = y
-        angle = random.uniform(0, 2 * math.pi)
-        speed = random.uniform(2, 6)
-        self.change_x = math.cos(angle) * speed
-        self.change_y = math.sin(angle) * speed
-        self.alpha = 255
-        self.lifetime = random.uniform(0.3, 0.7)
-        self.time_alive = 0
-        self.scale = 1.0
+    def acquire(self, *args, **kwargs):
+        """Берёт спрайт из пула (или создаёт новый) и сбрасывает его состояние"""
+        if self.free:
+            sprite = self.free.pop()
+        else:
+            sprite = self._create()
+        sprite.in_pool = False
+        sprite.reset(*args, **kwargs)
+        self.acquired += 1
+        return sprite
+
+    def release(self, sprite):
+        """Возвращает спрайт в пул"""
+        if sprite.in_pool:
+            return
+        sprite.remove_from_sprite_lists()
+        sprite.in_pool = True
+        self.free.append(sprite)
+        self.released += 1
+
+    def stats(self):
+        return {
+            "allocated": self.allocated,
+            "acquired": self.acquired,
+            "released": self.released,
+            "free": len(self.free),
+        }
+
+    def _create(self):
+        sprite = self.factory()
+        sprite.pool = self
+        sprite.in_pool = True
+        self.allocated += 1
+        return sprite
+
+
+class PooledSprite:
+    """Примесь для спрайтов, которые после использования возвращаются в пул"""
+    pool = None
+    in_pool = False
+
+    def retire(self):
+        """Убирает спрайт со сцены"""
+        if self.pool is None:
+            self.remove_from_sprite_lists()
+        else:
+            self.pool.release(self)
+
+
+PARTICLE_VERTEX_SHADER = """
+#version 330
+
+in vec2 in_pos;
+in vec4 in_color;
+in float in_radius;
+
+out vec4 v_color;
+out float v_radius;
+
+void main() {
+    gl_Position = vec4(in_pos, 0.0, 1.0);
+    v_color = in_color;
+    v_radius = in_radius;
+}
+"""
+
+PARTICLE_GEOMETRY_SHADER = """
+#version 330
+
+layout (points) in;
+layout (triangle_strip, max_vertices = 4) out;
+
+uniform WindowBlock {
+    mat4 projection;
+    mat4 view;
+} window;
+
+in vec4 v_color[];
+in float v_radius[];
+
+out vec4 g_color;
+out vec2 g_uv;
+
+void main() {
+    mat4 mvp = window.projection * window.view;
+    vec2 center = gl_in[0].gl_Position.xy;
+    float radius = v_radius[0];
+    for (int i = 0; i < 4; i++) {
+        vec2 corner = vec2(i % 2, i / 2) * 2.0 - 1.0;
+        gl_Position = mvp * vec4(center + corner * radius, 0.0, 1.0);
+        g_color = v_color[0];
+        g_uv = corner;
+        EmitVertex();
+    }
+    EndPrimitive();
+}
+"""
+
+PARTICLE_FRAGMENT_SHADER = """
+#version 330
+
+in vec4 g_color;
+in vec2 g_uv;
+
+out vec4 f_color;
+
+void main() {
+    if (dot(g_uv, g_uv) > 1.0) {
+        discard;
+    }
+    f_color = g_color;
+}
+"""
+
+PARTICLE_VERTEX = np.dtype([('pos', np.float32, 2), ('color', np.float32, 4), ('radius', np.float32)])
+
+
+class ParticleEmitter:
+    """Параметры одной вспышки частиц; скорости и затухание заданы на тик"""
+
+    def __init__(self, count=30, color=(0, 191, 255), radius=(3, 6), speed=(2, 6), lifetime=(0.3, 0.7),
+                 gravity=0.1, fade=3, shrink=0.95):
+        self.count = count
+        self.color = color
+        self.radius = radius
+        self.speed = speed
+        self.lifetime = lifetime
+        self.gravity = gravity
+        self.fade = fade
+        self.shrink = shrink
+
+
+EXPLOSION_EMITTER = ParticleEmitter()
+
+
+class ParticleSystem:
+    """Частицы в массивах NumPy: кольцевой буфер, одно обновление и один вызов отрисовки на кадр"""
+
+    def __init__(self, capacity=PARTICLE_CAPACITY, seed=None):
+        self.capacity = capacity
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.rng = np.random.default_rng(seed)
+
+        self.position = np.zeros((capacity, 2), np.float32)
+        self.velocity = np.zeros((capacity, 2), np.float32)
+        self.color = np.zeros((capacity, 3), np.float32)
+        self.alpha = np.zeros(capacity, np.float32)
+        self.radius = np.zeros(capacity, np.float32)
+        self.age = np.zeros(capacity, np.float32)
+        self.lifetime = np.zeros(capacity, np.float32)
+        self.gravity = np.zeros(capacity, np.float32)
+        self.fade = np.zeros(capacity, np.float32)
+        self.shrink = np.ones(capacity, np.float32)
+        self.alive = np.zeros(capacity, bool)
+
+        self.head = 0
+        self.emitted = 0
+        self.overwritten = 0
+
+        self.vertices = np.zeros(capacity, PARTICLE_VERTEX)
+        self.program = None
+        self.buffer = None
+        self.geometry = None
+
+    def emit(self, x, y, emitter=EXPLOSION_EMITTER):
+        """Выпускает emitter.count частиц из точки; при переполнении затираются самые старые"""
+        count = min(emitter.count, self.capacity)
+        slots = (self.head + np.arange(count)) % self.capacity
+        self.head = (self.head + count) % self.capacity
+        self.overwritten += int(self.alive[slots].sum())
+        self.emitted += count
+
+        angle = self.rng.uniform(0, 2 * math.pi, count)
+        speed = self.rng.uniform(*emitter.speed, count)
+        self.position[slots] = (x, y)
+        self.velocity[slots, 0] = np.cos(angle) * speed
+        self.velocity[slots, 1] = np.sin(angle) * speed
+        self.color[slots] = np.array(emitter.color[:3], np.float32) / 255
+        self.alpha[slots] = 255
+        self.radius[slots] = self.rng.integers(emitter.radius[0], emitter.radius[1], count, endpoint=True)
+        self.age[slots] = 0
+        self.lifetime[slots] = self.rng.uniform(*emitter.lifetime, count)
+        self.gravity[slots] = emitter.gravity
+        self.fade[slots] = emitter.fade
+        self.shrink[slots] = emitter.shrink
+        self.alive[slots] = True
 
     def update(self, delta_time):
-        self.change_y -= 0.1
-        self.center_x += self.change_x
-        self.center_y += self.change_y
+        if not self.alive.any():
+            return
+        self.velocity[:, 1] -= self.gravity
+        self.position += self.velocity
+        self.alpha -= self.fade
+        self.radius *= self.shrink
+        self.age += delta_time
+        self.alive &= (self.age < self.lifetime) & (self.alpha > 0)
+
+    @property
+    def live_count(self):
+        return int(self.alive.sum())
+
+    def stats(self):
+        return {
+            "live": self.live_count,
+            "capacity": self.capacity,
+            "emitted": self.emitted,
+            "overwritten": self.overwritten,
+        }
+
+    def draw(self):
+        """Все живые частицы одним вызовом: точки разворачиваются в круги геометрическим шейдером"""
+        live = np.flatnonzero(self.alive)
+        if not live.size:
+            return
+        if self.geometry is None:
+            self._create_gl_objects()
+
+        vertices = self.vertices[:live.size]
+        vertices['pos'] = self.position[live]
+        vertices['color'][:, :3] = self.color[live]
+        vertices['color'][:, 3] = self.alpha[live] / 255
+        vertices['radius'] = self.radius[live]
+        self.buffer.write(vertices.tobytes())
+        self.geometry.render(self.program, vertices=live.size)
+
+    def release(self):
+        """Отдаёт GPU-буфер и шейдер, при следующей отрисовке они создадутся заново"""
+        self.program = None
+        self.buffer = None
+        self.geometry = None
+        self.alive[:] = False
+
+    def _create_gl_objects(self):
+        ctx = arcade.get_window().ctx
+        self.program = ctx.program(
+            vertex_shader=PARTICLE_VERTEX_SHADER,
+            geometry_shader=PARTICLE_GEOMETRY_SHADER,
+            fragment_shader=PARTICLE_FRAGMENT_SHADER,
+        )
+        self.buffer = ctx.buffer(reserve=self.capacity * PARTICLE_VERTEX.itemsize)
+        self.geometry = ctx.geometry(
+            [BufferDescription(self.buffer, '2f 4f 1f', ['in_pos', 'in_color', 'in_radius'])],
+            mode=ctx.POINTS,
+        )
 
-        self.alpha -= 3
-        self.scale_x *= 0.95
-        self.scale_y *= 0.95
 
-        self.time_alive += delta_time
+PROJECTILE_VERTEX_SHADER = """
+#version 330
 
-        if self.time_alive >= self.lifetime or self.alpha <= 0:
-            self.remove_from_sprite_lists()
+in vec2 in_pos;
+in vec2 in_size;
+in float in_angle;
+in vec4 in_uv_top;
+in vec4 in_uv_bottom;
 
+out vec2 v_size;
+out float v_angle;
+out vec4 v_uv_top;
+out vec4 v_uv_bottom;
 
-class Bullet(arcade.Sprite):
-    def __init__(self, start_x, start_y, speed=1300, damage=1, is_vertical=None, game_view=None):
-        super().__init__()
-        self.texture = arcade.load_texture('data/hero/hero_bullet.png')
-        self.sound_bomb = arcade.load_sound('data/song/bomb_sound.wav')
-        self.change_x = speed
-        self.center_x = start_x
-        self.center_y = start_y
-        self.damage = damage
-        self.vertical = is_vertical
-        self.game_view = game_view
+void main() {
+    gl_Position = vec4(in_pos, 0.0, 1.0);
+    v_size = in_size;
+    v_angle = in_angle;
+    v_uv_top = in_uv_top;
+    v_uv_bottom = in_uv_bottom;
+}
+"""
+
+PROJECTILE_GEOMETRY_SHADER = """
+#version 330
+
+layout (points) in;
+layout (triangle_strip, max_vertices = 4) out;
+
+uniform WindowBlock {
+    mat4 projection;
+    mat4 view;
+} window;
+
+uniform sampler2D sprite_texture;
+
+in vec2 v_size[];
+in float v_angle[];
+in vec4 v_uv_top[];
+in vec4 v_uv_bottom[];
+
+out vec2 g_uv;
+
+void main() {
+    mat4 mvp = window.projection * window.view;
+    vec2 center = gl_in[0].gl_Position.xy;
+    vec2 hsize = v_size[0] / 2.0;
+    float angle = radians(v_angle[0]);
+    mat2 rot = mat2(cos(angle), -sin(angle), sin(angle), cos(angle));
+    vec2 hp = 0.5 / vec2(textureSize(sprite_texture, 0));
+
+    gl_Position = mvp * vec4(center + rot * vec2(-hsize.x, hsize.y), 0.0, 1.0);
+    g_uv = v_uv_top[0].xy + hp;
+    EmitVertex();
+    gl_Position = mvp * vec4(center + rot * vec2(-hsize.x, -hsize.y), 0.0, 1.0);
+    g_uv = v_uv_bottom[0].xy + vec2(hp.x, -hp.y);
+    EmitVertex();
+    gl_Position = mvp * vec4(center + rot * vec2(hsize.x, hsize.y), 0.0, 1.0);
+    g_uv = v_uv_top[0].zw + vec2(-hp.x, hp.y);
+    EmitVertex();
+    gl_Position = mvp * vec4(center + rot * vec2(hsize.x, -hsize.y), 0.0, 1.0);
+    g_uv = v_uv_bottom[0].zw - hp;
+    EmitVertex();
+    EndPrimitive();
+}
+"""
 
-        self.player = Hero()
+PROJECTILE_FRAGMENT_SHADER = """
+#version 330
 
-    def update(self, delta_time, bomb_list):
-        if (self.center_x >= SCREEN_WIDTH or self.center_x <= 0 or
-                self.center_y >= SCREEN_HEIGHT or self.center_y <= 0):
-            self.remove_from_sprite_lists()
+uniform sampler2D sprite_texture;
 
-        is_collisions = arcade.check_for_collision_with_list(self, bomb_list)
-        for bomb in is_collisions:
-            if self.game_view:
-                self.game_view.create_explosion_effect(bomb.center_x, bomb.center_y)
-                self.game_view.bombs_destroyed += 1
-            bomb.remove_from_sprite_lists()
-            self.remove_from_sprite_lists()
-            arcade.play_sound(self.sound_bomb, volume=0.8)
+in vec2 g_uv;
 
-        if self.vertical:
-            self.center_y += self.change_x * delta_time
-        else:
-            self.center_x += self.change_x * delta_time
+out vec4 f_color;
+
+void main() {
+    vec4 color = texture(sprite_texture, g_uv);
+    if (color.a == 0.0) {
+        discard;
+    }
+    f_color = color;
+}
+"""
+
+PROJECTILE_VERTEX = np.dtype([('pos', np.float32, 2), ('size', np.float32, 2), ('angle', np.float32),
+                              ('uv', np.float32, 8)])
+
+
+class ProjectileKind:
+    """Общее для снарядов одного вида: текстура с хитбоксом, вращение в градусах в секунду
+    и границы (left, right, bottom, top), за которыми снаряд исчезает"""
+
+    def __init__(self, texture, spin=0.0, bounds=(0, SCREEN_WIDTH, 0, SCREEN_HEIGHT)):
+        self.texture = texture
+        self.spin = spin
+        self.bounds = bounds
+        self.hit_box = texture.hit_box_points
+        self.reach = max(texture.width, texture.height) * 0.71
+
+
+class ProjectileSystem:
+    """Снаряды в массивах NumPy: живые лежат подряд в порядке появления, за тик все сдвигаются,
+    вращаются и отсекаются одним проходом, а рисуются одним вызовом"""
+    program = None
+
+    def __init__(self, kinds, capacity=PROJECTILE_CAPACITY):
+        self.kinds = list(kinds.values())
+        self.kind_index = {name: index for index, name in enumerate(kinds)}
+        self.size = np.array([kind.texture.size for kind in self.kinds], np.float32)
+        self.spin = np.array([kind.spin for kind in self.kinds], np.float64)
+        self.bounds = np.array([kind.bounds for kind in self.kinds], np.float64)
+        self.reach = np.array([kind.reach for kind in self.kinds], np.float64)
+
+        self.count = 0
+        self.capacity = 0
+        self.spawned = 0
+        self.culled = 0
+        self.removed = 0
+
+        self.buffer = None
+        self.geometry = None
+        self._allocate(capacity)
+
+    def spawn(self, name, x, y, velocity_x=0.0, velocity_y=0.0):
+        """Добавляет снаряд в конец; при нехватке места массивы растут вдвое"""
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+        index = self.count
+        self.position[index] = (x, y)
+        self.previous[index] = (x, y)
+        self.velocity[index] = (velocity_x, velocity_y)
+        self.angle[index] = 0
+        self.kind[index] = self.kind_index[name]
+        self.count += 1
+        self.spawned += 1
+
+    def update(self, delta_time):
+        count = self.count
+        if not count:
+            return
+        kind = self.kind[:count]
+        position = self.position[:count]
+        position += self.velocity[:count] * delta_time
+        self.angle[:count] += self.spin[kind] * delta_time
+        bounds = self.bounds[kind]
+        inside = ((position[:, 0] > bounds[:, 0]) & (position[:, 0] < bounds[:, 1]) &
+                  (position[:, 1] > bounds[:, 2]) & (position[:, 1] < bounds[:, 3]))
+        self.culled += count - int(inside.sum())
+        self._keep(inside)
+
+    def remove(self, indices):
+        """Убирает снаряды по индексам, порядок остальных сохраняется"""
+        if not indices:
+            return
+        keep = np.ones(self.count, bool)
+        keep[list(indices)] = False
+        self.removed += len(indices)
+        self._keep(keep)
+
+    def remember(self):
+        """Запоминает позиции перед тиком, чтобы сгладить их при отрисовке"""
+        self.previous[:self.count] = self.position[:self.count]
+
+    def collide(self, x, y, reach, points):
+        """Индексы снарядов, задевших многоугольник points с центром (x, y): сначала круги охвата
+        как в arcade.check_for_collision сразу по всем, затем точная проверка хитбоксов у оставшихся"""
+        count = self.count
+        if not count:
+            return []
+        radius = self.reach[self.kind[:count]] + reach
+        dx = self.position[:count, 0] - x
+        dy = self.position[:count, 1] - y
+        near = np.flatnonzero((np.abs(dx) <= radius) & (np.abs(dy) <= radius) & (dx * dx + dy * dy <= radius * radius))
+        return [index for index in near.tolist() if are_polygons_intersecting(points, self.shape(index)[3])]
+
+    def overlaps(self, other):
+        """Пары (свой, чужой) задевших друг друга снарядов двух систем по порядку своих индексов.
+        Чужие сортируются по x, полосы кандидатов для всех своих ищутся одним searchsorted, круги охвата
+        проверяются по всем парам полос сразу, а точные хитбоксы - только у оставшихся"""
+        count, other_count = self.count, other.count
+        if not count or not other_count:
+            return []
+        reach = self.reach[self.kind[:count]]
+        other_reach = other.reach[other.kind[:other_count]]
+        x = self.position[:count, 0]
+        order = np.argsort(other.position[:other_count, 0], kind='stable')
+        sorted_x = other.position[order, 0]
+        widest = reach + other_reach.max()
+        start = np.searchsorted(sorted_x, x - widest, 'left')
+        lengths = np.searchsorted(sorted_x, x + widest, 'right') - start
+        own = np.repeat(np.arange(count), lengths)
+        offsets = np.arange(len(own)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        found = order[np.repeat(start, lengths) + offsets]
+
+        dx = self.position[own, 0] - other.position[found, 0]
+        dy = self.position[own, 1] - other.position[found, 1]
+        radius = reach[own] + other_reach[found]
+        near = (np.abs(dx) <= radius) & (np.abs(dy) <= radius) & (dx * dx + dy * dy <= radius * radius)
+        own, found = own[near], found[near]
+        ranked = np.lexsort((found, own))
+
+        own_shapes, other_shapes = {}, {}
+        pairs = []
+        for index, match in zip(own[ranked].tolist(), found[ranked].tolist()):
+            if index not in own_shapes:
+                own_shapes[index] = self.shape(index)[3]
+            if match not in other_shapes:
+                other_shapes[match] = other.shape(match)[3]
+            if are_polygons_intersecting(own_shapes[index], other_shapes[match]):
+                pairs.append((index, match))
+        return pairs
+
+    def hits(self, sprite):
+        return self.collide(sprite.center_x, sprite.center_y, max(sprite.width, sprite.height) * 0.71,
+                            sprite.hit_box.get_adjusted_points())
+
+    def shape(self, index):
+        """Центр, радиус охвата и хитбокс снаряда в мировых координатах, повёрнутый так же, как у спрайта"""
+        x, y = self.position[index].tolist()
+        kind = self.kinds[self.kind[index]]
+        rad = math.radians(-float(self.angle[index]))
+        cos, sin = math.cos(rad), math.sin(rad)
+        return x, y, kind.reach, [(x + px * cos - py * sin, y + px * sin + py * cos) for px, py in kind.hit_box]
+
+    def stats(self):
+        return {
+            "live": self.count,
+            "capacity": self.capacity,
+            "spawned": self.spawned,
+            "culled": self.culled,
+            "removed": self.removed,
+        }
+
+    def draw(self, alpha=1.0):
+        """Все снаряды одним вызовом: точки разворачиваются в повёрнутые квадраты с текстурой из атласа"""
+        count = self.count
+        if not count:
+            return
+        ctx = arcade.get_window().ctx
+        if ProjectileSystem.program is None:
+            ProjectileSystem.program = ctx.program(
+                vertex_shader=PROJECTILE_VERTEX_SHADER,
+                geometry_shader=PROJECTILE_GEOMETRY_SHADER,
+                fragment_shader=PROJECTILE_FRAGMENT_SHADER,
+            )
+        if self.geometry is None:
+            self.buffer = ctx.buffer(reserve=self.capacity * PROJECTILE_VERTEX.itemsize)
+            self.geometry = ctx.geometry(
+                [BufferDescription(self.buffer, '2f 2f 1f 4f 4f',
+                                   ['in_pos', 'in_size', 'in_angle', 'in_uv_top', 'in_uv_bottom'])],
+                mode=ctx.POINTS,
+            )
+
+        atlas = ctx.default_atlas
+        uv = np.array([atlas.add(kind.texture)[1].texture_coordinates for kind in self.kinds], np.float32)
+        kind = self.kind[:count]
+        previous = self.previous[:count]
+        vertices = self.vertices[:count]
+        vertices['pos'] = previous + (self.position[:count] - previous) * alpha
+        vertices['size'] = self.size[kind]
+        vertices['angle'] = self.angle[:count]
+        vertices['uv'] = uv[kind]
+        self.buffer.write(vertices.tobytes())
+        atlas.texture.use(0)
+        with ctx.enabled(ctx.BLEND):
+            ctx.blend_func = ctx.BLEND_DEFAULT
+            self.geometry.render(ProjectileSystem.program, vertices=count)
+
+    def release(self):
+        """Отдаёт GPU-буфер и убирает все снаряды"""
+        self.buffer = None
+        self.geometry = None
+        self.count = 0
+
+    def _allocate(self, capacity):
+        count = self.count
+        old = (self.position, self.previous, self.velocity, self.angle, self.kind) if self.capacity else None
+        self.position = np.zeros((capacity, 2), np.float64)
+        self.previous = np.zeros((capacity, 2), np.float64)
+        self.velocity = np.zeros((capacity, 2), np.float64)
+        self.angle = np.zeros(capacity, np.float64)
+        self.kind = np.zeros(capacity, np.intp)
+        if old is not None:
+            for array, values in zip((self.position, self.previous, self.velocity, self.angle, self.kind), old):
+                array[:count] = values[:count]
+        self.vertices = np.zeros(capacity, PROJECTILE_VERTEX)
+        self.capacity = capacity
+        self.buffer = None
+        self.geometry = None
+
+    def _keep(self, keep):
+        live = int(keep.sum())
+        if live == self.count:
+            return
+        for array in (self.position, self.previous, self.velocity, self.angle, self.kind):
+            array[:live] = array[:self.count][keep]
+        self.count = live
 
 
-class EnemyBomb(arcade.Sprite):
-    def __init__(self, x, y, speed):
+class Coin(PooledSprite, arcade.Sprite):
+    def __init__(self):
         super().__init__()
-        self.idle_texture = arcade.load_texture('data/enemy/bomb.png')
-        self.texture = self.idle_texture
+        self.scale = 1.3
+
+    def reset(self, texture, x, y):
+        self.texture = texture
         self.center_x = x
         self.center_y = y
-        self.speed = speed
-        self.scale = 1
-        self.rotation_speed = 150
-        self.angle = 0
 
-    def update(self, delta_time) -> None:
-        self.center_y -= self.speed * delta_time
 
-        if self.center_y <= 190:
-            self.remove_from_sprite_lists()
+class AiScheduler:
+    """Решения ИИ реже тика симуляции: каждый агент думает rate раз в секунду, а агенты разнесены
+    по соседним тикам, чтобы их решения не сходились в один кадр. Движение идёт в update каждый тик"""
+
+    def __init__(self, rate=AI_RATE):
+        self.rate = rate
+        self.step = 1 / rate
+        self.agents = []
+        self.due = []
+        self.time = 0.0
+        self.decisions = 0
 
-    def update_animation(self, delta_time: float = 1 / 60, *args, **kwargs) -> None:
-        self.angle += self.rotation_speed * delta_time
+    def add(self, agent):
+        slots = max(1, round(self.step / SIMULATION_STEP))
+        self.due.append(self.time + len(self.agents) % slots * SIMULATION_STEP)
+        self.agents.append(agent)
+
+    def clear(self):
+        self.agents.clear()
+        self.due.clear()
+
+    def update(self, delta_time):
+        """Вызывает think у агентов, чей срок ближе половины тика"""
+        for index, agent in enumerate(self.agents):
+            if self.due[index] - self.time < delta_time / 2:
+                self.due[index] = max(self.due[index] + self.step, self.time)
+                agent.think(max(self.step, delta_time))
+                self.decisions += 1
+        self.time += delta_time
+
+    def stats(self):
+        return {"rate": self.rate, "agents": len(self.agents), "decisions": self.decisions}
+
+
+# Переходы босса: следующее состояние и сколько секунд держится текущее, None — до приземления
+GUPI_TRANSITIONS = {
+    GupiState.IDLE: (GupiState.PREPARING, 1.0),
+    GupiState.PREPARING: (GupiState.JUMPING, 0.3),
+    GupiState.JUMPING: (GupiState.LANDING, None),
+    GupiState.LANDING: (GupiState.IDLE, 0.3),
+}
 
 
 class EnemyGupi(arcade.Sprite):
+    transitions = GUPI_TRANSITIONS
+
     def __init__(self):
         super().__init__()
-        self.idle_texture = arcade.load_texture('data/enemy/gupi/goopy0.png')
-        self.prepare_texture = arcade.load_texture('data/enemy/gupi/goopy3.png')
-        self.jump_texture = arcade.load_texture('data/enemy/gupi/goopy_jump.png')
-        self.hit_texture_1 = arcade.load_texture('data/enemy/gupi/goopy1.png')
-        self.hit_texture_2 = arcade.load_texture('data/enemy/gupi/goopy2.png')
-        self.dead_texture_1 = arcade.load_texture('data/enemy/gupi/goopy_dead.png')
-        self.dead_texture_2 = arcade.load_texture('data/enemy/gupi/goopy_dead2.png')
-        self.texture = self.idle_texture
-        self.dead_timer = 0
-        self.show_dead_texture_2 = True
+        self.idle_texture = ASSETS.facing('data/enemy/gupi/goopy0.png', FaceDirection.LEFT)
+        self.prepare_texture = ASSETS.facing('data/enemy/gupi/goopy3.png', FaceDirection.LEFT)
+        self.jump_texture = ASSETS.facing('data/enemy/gupi/goopy_jump.png', FaceDirection.LEFT)
+        self.hit_animation = ASSETS.facing_animation(['data/enemy/gupi/goopy1.png', 'data/enemy/gupi/goopy2.png'],
+                                                     0.3, loop=False, faces=FaceDirection.LEFT)
+        self.dead_animation = ASSETS.facing_animation(['data/enemy/gupi/goopy_dead2.png',
+                                                       'data/enemy/gupi/goopy_dead.png'],
+                                                      0.4, loop=False, faces=FaceDirection.LEFT)
+        self.state_textures = {
+            GupiState.IDLE: self.idle_texture,
+            GupiState.PREPARING: self.prepare_texture,
+            GupiState.JUMPING: self.jump_texture,
+            GupiState.LANDING: self.prepare_texture,
+        }
+        self.animation = Animation()
+        self.texture = self.idle_texture[FaceDirection.LEFT]
 
         self.health = 100
         self.scale = 1.7
         self.center_y = 300
         self.center_x = SCREEN_WIDTH - 250
 
-        self.landing = arcade.load_sound('data/enemy/gupi/landing.wav')
-        self.jump = arcade.load_sound('data/enemy/gupi/jump.wav')
-        self.hit = arcade.load_sound('data/enemy/gupi/hit.wav')
-        self.hit1 = arcade.load_sound('data/enemy/gupi/hit1.wav')
+        self.landing = ASSETS.sound('data/enemy/gupi/landing.wav')
+        self.jump = ASSETS.sound('data/enemy/gupi/jump.wav')
+        self.hit = ASSETS.sound('data/enemy/gupi/hit.wav')
+        self.hit1 = ASSETS.sound('data/enemy/gupi/hit1.wav')
 
         self.move_speed = 600
         self.jump_speed = 28
         self.face_direction = FaceDirection.LEFT
 
-        self.state = "idle"
-        self.state_timer = 0
-        self.timer_hit = 0
+        self.state = GupiState.IDLE
+        self.state_time = 0
         self.change_y = 0
         self.change_x = 0
         self.on_ground = True
@@ -697,110 +2129,84 @@ class EnemyGupi(arcade.Sprite):
         self.right_boundary = SCREEN_WIDTH - 300
 
         self.hit_timer = 0
-        self.hit_timer_change = 0
         self.show_hit = False
 
-        self.idle_timer = 1
         self.player = None
 
-    def update(self, delta_time, bullet_list, player=None) -> None:
+    def hit_by_bullet(self):
+        """Попадание пули: каждые 10 единиц урона босс мигает"""
+        self.health -= 1
+        if self.health % 10 == 0:
+            self.show_hit = True
+            self.hit_timer = 0
+            self.original_face_direction = self.face_direction
+
+    def think(self, step):
+        """Решения босса по таблице переходов, step — время с прошлого решения"""
         if self.health <= 0:
-            self.dead_timer += delta_time
-            if self.dead_timer >= 0.4:
-                self.show_dead_texture_2 = False
             return
 
-        self.state_timer += delta_time
-
-        if player:
-            self.player = player
-
         if self.show_hit:
-            self.hit_timer += delta_time
+            self.hit_timer += step
             if self.hit_timer >= 1:
                 self.show_hit = False
                 self.hit_timer = 0
+            return
 
-        collision_with_bullet = arcade.check_for_collision_with_list(self, bullet_list)
-        for bullet in collision_with_bullet:
-            if bullet.game_view:
-                bullet.game_view.create_explosion_effect(bullet.center_x, bullet.center_y)
-            bullet.remove_from_sprite_lists()
-            self.health -= 1
+        self.state_time += step
+        next_state, duration = self.transitions[self.state]
+        if self.on_ground if duration is None else self.state_time >= duration:
+            self.enter(next_state)
 
-            if self.health % 10 == 0:
-                self.show_hit = True
-                self.hit_timer = 0
-                self.original_face_direction = self.face_direction
+        if self.center_x < self.left_boundary:
+            self.face_direction = FaceDirection.RIGHT
+        elif self.center_x > self.right_boundary:
+            self.face_direction = FaceDirection.LEFT
 
-        if not self.show_hit:
-            if self.state == "idle":
-                self.change_x = 0
-                self.change_y = 0
+    def enter(self, state):
+        self.state = state
+        self.state_time = 0
+        if state is GupiState.JUMPING:
+            if self.center_x <= self.left_boundary:
+                self.face_direction = FaceDirection.RIGHT
+            elif self.center_x >= self.right_boundary:
+                self.face_direction = FaceDirection.LEFT
 
-                self.idle_timer -= delta_time
-                if self.idle_timer <= 0:
-                    self.state = "preparing"
-                    self.state_timer = 0
-
-            elif self.state == "preparing":
-                if self.state_timer >= 0.3:
-                    self.state = "jumping"
-                    self.state_timer = 0
-                    self.on_ground = False
-                    self.change_y = self.jump_speed
-                    self.jump.play()
-
-                    if self.center_x <= self.left_boundary:
-                        self.face_direction = FaceDirection.RIGHT
-                    elif self.center_x >= self.right_boundary:
-                        self.face_direction = FaceDirection.LEFT
-
-                    if self.face_direction == FaceDirection.RIGHT:
-                        self.change_x = self.move_speed
-                    else:
-                        self.change_x = -self.move_speed
+            self.on_ground = False
+            self.change_y = self.jump_speed
+            if self.face_direction == FaceDirection.RIGHT:
+                self.change_x = self.move_speed
+            else:
+                self.change_x = -self.move_speed
+            MIXER.play(self.jump, "boss")
 
-            elif self.state == "jumping":
-                self.change_y -= GRAVITY
+    def update(self, delta_time, player=None) -> None:
+        """Движение босса каждый тик; пока он мигает от попадания, он замирает"""
+        if self.health <= 0:
+            return
 
-                self.center_x += self.change_x * delta_time
-                self.center_y += self.change_y
+        if player:
+            self.player = player
 
-                if self.center_y <= 300:
-                    self.center_y = 300
-                    self.change_y = 0
-                    self.state = "landing"
-                    self.landing.play()
-                    self.state_timer = 0
-
-            elif self.state == "landing":
-                if self.state_timer >= 0.3:
-                    self.state = "idle"
-                    self.state_timer = 0
-                    self.on_ground = True
-                    self.idle_timer = 1
-
-            if self.center_x < self.left_boundary:
-                self.face_direction = FaceDirection.RIGHT
-            elif self.center_x > self.right_boundary:
-                self.face_direction = FaceDirection.LEFT
+        if not self.on_ground and not self.show_hit:
+            self.change_y -= GRAVITY
+            self.center_x += self.change_x * delta_time
+            self.center_y += self.change_y
+
+            if self.center_y <= 300:
+                self.center_y = 300
+                self.change_x = 0
+                self.change_y = 0
+                self.on_ground = True
+                MIXER.play(self.landing, "boss")
 
-        if self.show_hit and self.player:
-            if self.player.center_x > self.center_x:
-                self.face_direction = FaceDirection.RIGHT
-            else:
-                self.face_direction = FaceDirection.LEFT
         self.center_x = max(self.width / 2, min(SCREEN_WIDTH - self.width / 2, self.center_x))
         self.center_y = max(self.height / 2, min(SCREEN_HEIGHT - self.height / 2, self.center_y))
 
-    def update_animation(self, delta_time):
+    def update_animation(self, delta_time, now=0.0):
         """Обновление анимации и поворота текстуры"""
         if self.health <= 0:
-            if self.show_dead_texture_2:
-                self.texture = self.dead_texture_2
-            else:
-                self.texture = self.dead_texture_1
+            set_facing_texture(self, self.animation.play(self.dead_animation, now), FaceDirection.LEFT)
             return
         if self.show_hit and self.player:
             if self.player.center_x > self.center_x:
@@ -808,38 +2214,27 @@ class EnemyGupi(arcade.Sprite):
             else:
                 self.face_direction = FaceDirection.LEFT
         if self.show_hit:
-            self.hit_timer_change += delta_time
-            if self.hit_timer_change <= 0.3:
-                current_texture = self.hit_texture_1
+            current_texture = self.animation.play(self.hit_animation, now)
+            if current_texture is self.hit_animation.frames[0]:
                 if not self.hit_sound_played:
-                    self.hit.play()
+                    MIXER.play(self.hit, "boss", priority=1)
                     self.hit_sound_played = True
                     self.hit1_sound_played = False
-            else:
-                current_texture = self.hit_texture_2
-                if not self.hit1_sound_played:
-                    self.hit1.play()
-                    self.hit1_sound_played = True
+            elif not self.hit1_sound_played:
+                MIXER.play(self.hit1, "boss", priority=1)
+                self.hit1_sound_played = True
         else:
+            self.animation.stop()
             self.hit_sound_played = False
             self.hit1_sound_played = False
-            self.hit_timer_change = 0
-            if self.state == "idle":
-                current_texture = self.idle_texture
-            elif self.state == "preparing":
-                current_texture = self.prepare_texture
-            elif self.state == "jumping":
-                current_texture = self.jump_texture
-            elif self.state == "landing":
-                current_texture = self.prepare_texture
-            else:
-                current_texture = self.idle_texture
+            current_texture = self.state_textures[self.state]
 
-        if self.face_direction == FaceDirection.RIGHT:
-            self.texture = current_texture.flip_horizontally()
-        else:
-            self.texture = current_texture
-        self.sync_hit_box_to_texture()
+        set_facing_texture(self, current_texture, self.face_direction)
+
+
+BOSSES = {
+    "gupi": EnemyGupi,
+}
 
 
 class Hero(arcade.Sprite):
@@ -849,36 +2244,29 @@ class Hero(arcade.Sprite):
         self.speed = 500
         self.health = 3
 
-        self.idle_texture = arcade.load_texture("data/hero/hero_0.png")
-        self.jump_texture = arcade.load_texture('data/hero/hero_3.png')
-        self.defeat_texture = arcade.load_texture('data/hero/hero_defeat.png')
-        self.texture = self.idle_texture
-        self.dash_texture_1 = arcade.load_texture('data/hero/hero_6.png')
-        self.dash_texture_2 = arcade.load_texture('data/hero/hero_7.png')
-        self.dash_animation_timer = 0
-        self.show_dash_texture_2 = False
-
-        self.walk_textures = []
-        for i in range(1, 6):
-            texture = arcade.load_texture(f'data/hero/hero_{i}.png')
-            self.walk_textures.append(texture)
+        self.idle_texture_front = ASSETS.facing("data/hero/hero_0.png")
+        self.idle_texture_up = ASSETS.facing('data/hero/hero_0_1.png')
+        self.idle_texture = self.idle_texture_front
+        self.jump_texture = ASSETS.facing('data/hero/hero_3.png')
+        self.defeat_texture = ASSETS.facing('data/hero/hero_defeat.png')
+        self.texture = self.idle_texture[FaceDirection.RIGHT]
+        self.dash_animation = ASSETS.facing_animation(['data/hero/hero_6.png', 'data/hero/hero_7.png'], 0.4,
+                                                      loop=False)
+        self.walk_animation = ASSETS.facing_animation([f'data/hero/hero_{i}.png' for i in range(1, 6)], 0.1)
+        self.animation = Animation()
 
         self.hp_list = []
         for i in range(4):
-            hp = arcade.load_texture(f'data/HP_table/hp{i}.png')
+            hp = ASSETS.texture(f'data/HP_table/hp{i}.png')
             self.hp_list.append(hp)
 
         self.texture_hp = self.hp_list[self.health]
 
-        self.jump_sound = arcade.load_sound("data/hero/jump.wav")
-        self.attack_sound = arcade.load_sound('data/hero/fire_sound.wav')
-        self.hit_sound = arcade.load_sound('data/song/hit_sound.wav')
-        self.dash_sound = arcade.load_sound('data/hero/dash.wav')
-        self.death_sound = arcade.load_sound('data/hero/player_death.wav')
-
-        self.current_texture = 0
-        self.texture_change_time = 0
-        self.texture_change_delay = 0.1
+        self.jump_sound = ASSETS.sound("data/hero/jump.wav")
+        self.attack_sound = ASSETS.sound('data/hero/fire_sound.wav')
+        self.hit_sound = ASSETS.sound('data/song/hit_sound.wav')
+        self.dash_sound = ASSETS.sound('data/hero/dash.wav')
+        self.death_sound = ASSETS.sound('data/hero/player_death.wav')
 
         self.timer_hp_table = 1
         self.timer_hp = 0
@@ -918,57 +2306,44 @@ class Hero(arcade.Sprite):
         self.center_x = 200
         self.center_y = 225
 
-    def update_animation(self, delta_time: float = 1 / 60, *args, **kwargs) -> None:
-        if self.is_dashing:
-            self.dash_animation_timer += delta_time
-            if self.dash_animation_timer >= 0.4:
-                self.show_dash_texture_2 = True
-
-            if self.show_dash_texture_2:
-                current_dash_texture = self.dash_texture_2
-            else:
-                current_dash_texture = self.dash_texture_1
-
-            if self.face_direction == FaceDirection.RIGHT:
-                self.texture = current_dash_texture
-            else:
-                self.texture = current_dash_texture.flip_horizontally()
+    def update_animation(self, delta_time: float = 1 / 60, now: float = 0.0, *args, **kwargs) -> None:
+        animation = None
+        if self.health <= 0:
+            current_texture = self.defeat_texture
+        elif self.is_dashing:
+            animation = self.dash_animation
         elif self.is_shooting:
-            if self.face_direction == FaceDirection.RIGHT:
-                self.texture = self.idle_texture
-            else:
-                self.texture = self.idle_texture.flip_horizontally()
+            current_texture = self.idle_texture
         elif self.is_jump or not (self.is_on_ground or self.is_on_platform):
-            if self.face_direction == FaceDirection.RIGHT:
-                self.texture = self.jump_texture
-            else:
-                self.texture = self.jump_texture.flip_horizontally()
+            current_texture = self.jump_texture
         elif self.is_walking:
-            self.texture_change_time += delta_time
-            if self.texture_change_time >= self.texture_change_delay:
-                self.texture_change_time = 0
-                self.current_texture += 1
-                if self.current_texture >= len(self.walk_textures):
-                    self.current_texture = 0
-                if self.face_direction == FaceDirection.RIGHT:
-                    self.texture = self.walk_textures[self.current_texture]
-                else:
-                    self.face_direction = FaceDirection.LEFT
-                    self.texture = self.walk_textures[self.current_texture].flip_horizontally()
+            animation = self.walk_animation
         else:
-            if self.face_direction == FaceDirection.RIGHT:
-                self.texture = self.idle_texture
-            else:
-                self.face_direction = FaceDirection.LEFT
-                self.texture = self.idle_texture.flip_horizontally()
-        if self.health <= 0:
-            if self.face_direction == FaceDirection.RIGHT:
-                self.texture = self.defeat_texture
-            else:
-                self.texture = self.defeat_texture.flip_horizontally()
-        self.sync_hit_box_to_texture()
+            current_texture = self.idle_texture
+
+        if animation is None:
+            self.animation.stop()
+        else:
+            current_texture = self.animation.play(animation, now)
+        set_facing_texture(self, current_texture, self.face_direction)
+
+    def hit_by_bomb(self):
+        if self.health > 0:
+            MIXER.play(self.hit_sound, "hero", priority=2)
+            self.health -= 1
+            if self.health >= 0:
+                self.texture_hp = self.hp_list[self.health]
+
+    def hit_by_boss(self):
+        if not self.invulnerability:
+            MIXER.play(self.hit_sound, "hero", priority=2)
+            self.health -= 1
+            self.timer_invulnerability = 0
+            self.invulnerability = True
+            if self.health >= 0:
+                self.texture_hp = self.hp_list[self.health]
 
-    def update(self, delta_time, keys_pressed, bullet_list, platform_list, boomb_list, game_view, gupi_list):
+    def update(self, delta_time, keys_pressed, bullets, platform_list):
         """ Перемещение персонажа и стрельба"""
         self.dx = 0
         if self.health <= 0:
@@ -985,26 +2360,6 @@ class Hero(arcade.Sprite):
             if self.dash_timer >= self.dash_duration:
                 self.stop_dash()
 
-        check_bombs_with_hero = arcade.check_for_collision_with_list(self, boomb_list)
-        for bomb in check_bombs_with_hero:
-            bomb.remove_from_sprite_lists()
-            if self.health > 0:
-                arcade.play_sound(self.hit_sound)
-                self.health -= 1
-                if self.health >= 0:
-                    self.texture_hp = self.hp_list[self.health]
-
-        check_gupi_with_hero = arcade.check_for_collision_with_list(self, gupi_list)
-        self.sync_hit_box_to_texture()
-        for _ in check_gupi_with_hero:
-            if not self.invulnerability:
-                self.hit_sound.play()
-                self.health -= 1
-                self.timer_invulnerability = 0
-                self.invulnerability = True
-                if self.health >= 0:
-                    self.texture_hp = self.hp_list[self.health]
-
         if self.invulnerability:
             self.timer_invulnerability += delta_time
             if self.timer_invulnerability >= 1.0:
@@ -1020,11 +2375,6 @@ class Hero(arcade.Sprite):
             else:
                 self.texture_hp = self.hp_list[0]
 
-        if self.health <= 0:
-            game_view.show_game_over(is_win=False)
-            self.death_sound.play()
-            return
-
         if self.is_on_ground or self.is_on_platform:
             self.was_on_platform = True
             self.coyote_timer = 0
@@ -1055,10 +2405,10 @@ class Hero(arcade.Sprite):
         is_aiming_up = arcade.key.W in keys_pressed or arcade.key.UP in keys_pressed
 
         if is_aiming_up:
-            self.idle_texture = arcade.load_texture('data/hero/hero_0_1.png')
+            self.idle_texture = self.idle_texture_up
             self.is_aiming_up = True
         else:
-            self.idle_texture = arcade.load_texture('data/hero/hero_0.png')
+            self.idle_texture = self.idle_texture_front
             self.is_aiming_up = False
 
         if arcade.key.LCTRL in keys_pressed and self.can_fire:
@@ -1068,18 +2418,16 @@ class Hero(arcade.Sprite):
             if is_aiming_up:
                 start_x = self.center_x + 29 if self.face_direction == FaceDirection.RIGHT else self.center_x - 29
                 start_y = self.center_y + self.height // 3
-                bullet = Bullet(start_x, start_y, is_vertical=True, game_view=game_view)
-                bullet.texture = bullet.texture.rotate_90()
+                bullets.spawn("bullet_up", start_x, start_y, velocity_y=BULLET_SPEED)
             else:
                 if self.face_direction == FaceDirection.RIGHT:
                     start_x = self.center_x + self.width // 3
                     start_y = self.center_y
-                    bullet = Bullet(start_x, start_y, is_vertical=False, game_view=game_view)
+                    bullets.spawn("bullet", start_x, start_y, velocity_x=BULLET_SPEED)
                 else:
                     start_x = self.center_x - self.width // 3
                     start_y = self.center_y
-                    bullet = Bullet(start_x, start_y, -1300, is_vertical=False, game_view=game_view)
-            bullet_list.append(bullet)
+                    bullets.spawn("bullet", start_x, start_y, velocity_x=-BULLET_SPEED)
         if not self.is_dashing:
             if arcade.key.LEFT in keys_pressed or arcade.key.A in keys_pressed:
                 self.dx -= self.speed * delta_time
@@ -1151,17 +2499,16 @@ class Hero(arcade.Sprite):
     def shoot(self):
         """Запуск анимации выстрела"""
         self.is_shooting = True
-        self.attack_sound.play()
+        MIXER.play(self.attack_sound, "weapon")
         self.shoot_timer = 0
 
     def dash(self):
         """Активация рывка"""
         if self.can_dash and not self.is_dashing:
-            self.dash_sound.play()
+            MIXER.play(self.dash_sound, "hero", priority=1)
             self.is_dashing = True
             self.dash_timer = 0
-            self.dash_animation_timer = 0
-            self.show_dash_texture_2 = False
+            self.animation.stop()
             self.can_dash = False
             self.dash_cooldown_timer = 0
             self.change_y = 0
@@ -1172,52 +2519,324 @@ class Hero(arcade.Sprite):
         self.dash_timer = 0
 
 
-class MyGame(arcade.View):
-    def __init__(self, level=None):
-        super().__init__()
-        self.current_level = level
-        self.camera = arcade.Camera2D()
+class Hud:
+    """Интерфейс уровня: HP, монеты, таймер и обратный отсчёт.
+    Тексты создаются один раз и перестраиваются только при смене показываемого значения"""
 
-        self.tv_effect = TVEffect(SCREEN_WIDTH, SCREEN_HEIGHT)
+    def __init__(self):
+        self.batch = Batch()
+        self.icons = arcade.SpriteList()
+
+        self.hp_icon = arcade.Sprite(ASSETS.texture('data/HP_table/hp3.png'), center_x=100, center_y=60)
+        self.hp_icon.size = (100, 50)
+        self.coin_icon = arcade.Sprite(ASSETS.texture('data/coins/coin1.png'), center_x=SCREEN_WIDTH - 120,
+                                       center_y=60)
+        self.coin_icon.size = (44, 57)
+        self.icons.append(self.hp_icon)
+        self.icons.append(self.coin_icon)
+
+        self.coins_value = 0
+        self.coins_text = arcade.Text(': 0', SCREEN_WIDTH - 100, 45, COLOR, 25, font_name='Gill Sans',
+                                      batch=self.batch)
+
+        self.timer_value = None
+        self.timer_text = arcade.Text('', SCREEN_WIDTH // 2, SCREEN_HEIGHT - 50, arcade.color.WHITE, 30,
+                                      anchor_x="center", font_name="Gill Sans", bold=True, batch=self.batch)
+        self.timer_text.visible = False
+
+        self.countdown_stage = None
+        self.countdown_text = arcade.Text('', SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, arcade.color.RED, 200,
+                                          anchor_x="center", anchor_y="center", font_name="Gill Sans", bold=True)
+
+    def set_hp(self, texture):
+        if self.hp_icon.texture is not texture:
+            self.hp_icon.texture = texture
+            self.hp_icon.size = (100, 50)
+
+    def set_coins(self, total):
+        if total != self.coins_value:
+            self.coins_value = total
+            self.coins_text.text = f': {total}'
+
+    def show_timer(self, visible):
+        if self.timer_text.visible != visible:
+            self.timer_text.visible = visible
+
+    def set_timer(self, seconds):
+        if seconds <= 10:
+            color = arcade.color.RED
+        elif seconds <= 30:
+            color = arcade.color.YELLOW
+        else:
+            color = arcade.color.WHITE
+        value = (int(seconds), color)
+        if value == self.timer_value:
+            return
+        self.timer_value = value
+        whole = value[0]
+        self.timer_text.text = f"{whole // 60:02d}:{whole % 60:02d}"
+        self.timer_text.color = color
+
+    def set_countdown(self, value):
+        """Обновляет надпись отсчёта, возвращает True если она сменилась"""
+        if value > 1:
+            stage = (str(value - 1), arcade.color.RED, 200)
+        elif value == 1:
+            stage = ("Ready?", arcade.color.YELLOW, 120)
+        else:
+            stage = None
+        if stage == self.countdown_stage:
+            return False
+        self.countdown_stage = stage
+        if stage is not None:
+            self.countdown_text.text, self.countdown_text.color, self.countdown_text.font_size = stage
+        return True
+
+    def draw(self):
+        self.icons.draw()
+        self.batch.draw()
 
-        self.coin_list = arcade.SpriteList(use_spatial_hash=True)
-        self.player_list = arcade.SpriteList(use_spatial_hash=True)
-        self.bullet_list = arcade.SpriteList(use_spatial_hash=True)
-        self.bomb_list = arcade.SpriteList(use_spatial_hash=True)
-        self.platform_list = arcade.SpriteList(use_spatial_hash=True)
-        self.gupi_list = arcade.SpriteList(use_spatial_hash=True)
-        self.explosion_particles = arcade.SpriteList(use_spatial_hash=True)
-
-        self.coin_texture = arcade.load_texture('data/coins/coin1.png')
-        self.texture_hp = None
-
-        if level == 1:
-            self.texture_background = arcade.load_texture('data/others/background_2.jpeg')
-            self.platform_texture = 'data/others/platform_1.png'
-            self.background_music = arcade.load_sound('data/song/introduction.wav')
-            self.texture_table = arcade.load_texture('data/others/table.png')
-
-            self.level_timer = 90.0
-            self.timer_running = False
-        elif level == 2:
-            self.knockout_texture = arcade.load_texture('data/others/knockout.png')
-            self.texture_background = arcade.load_texture('data/others/background.jpg')
-            self.platform_texture = 'data/others/platform_0.png'
-            self.background_music = arcade.load_sound('data/song/Die-House.wav')
-            self.texture_table = arcade.load_texture('data/others/table.png')
-
-        self.sound_coin = arcade.load_sound("data/coins/voicy_coin.wav")
+    def draw_countdown(self):
+        arcade.draw_rect_filled(arcade.rect.XYWH(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, SCREEN_WIDTH, SCREEN_HEIGHT),
+                                (0, 0, 0, 100))
+        if self.countdown_stage is not None:
+            self.countdown_text.draw()
+
+
+class LevelDefinition:
+    """Описание уровня из data/levels/level_N.json: оформление, лимит времени, босс,
+    точный список нужных файлов и расписание появлений"""
+
+    def __init__(self, number, data):
+        self.number = number
+        self.name = data.get("name", f"Level {number}")
+        self.background = data["background"]
+        self.table = data["table"]
+        self.platform = data["platform"]
+        self.music = data["music"]
+        self.time_limit = data.get("time_limit")
+        self.boss = data.get("boss")
+        self.knockout = data.get("knockout")
+        self.assets = data["assets"]
+        spawns = data.get("spawns", [])
+        for rule in spawns:
+            if rule["kind"] not in SPAWN_KINDS:
+                raise ValueError(f"level {number}: unknown spawn kind {rule['kind']!r}, "
+                                 f"expected one of: {', '.join(SPAWN_KINDS)}")
+        self.timeline = self.compile_timeline(spawns)
+
+    @staticmethod
+    def compile_timeline(spawns):
+        """Правила «каждые every секунд с start до until» разворачиваются заранее
+        в отсортированный список (время, что появляется, параметры)"""
+        timeline = []
+        for rule in spawns:
+            params = {key: value for key, value in rule.items() if key not in ("kind", "start", "every", "until")}
+            every = rule.get("every")
+            count = int((rule["until"] - rule["start"]) / every + 1e-9) + 1 if every else 1
+            for i in range(count):
+                timeline.append((rule["start"] + i * (every or 0), rule["kind"], params))
+        timeline.sort(key=lambda event: event[0])
+        return timeline
+
+    def has_spawns(self, kind):
+        return any(event[1] == kind for event in self.timeline)
+
+
+LEVEL_DEFINITIONS = {}
+
+
+def load_level(number):
+    """Описание уровня, файл читается один раз"""
+    level = LEVEL_DEFINITIONS.get(number)
+    if level is None:
+        with open(os.path.join(LEVELS_DIR, f'level_{number}.json'), encoding='utf-8') as f:
+            level = LevelDefinition(number, json.load(f))
+        LEVEL_DEFINITIONS[number] = level
+    return level
+
+
+def available_levels():
+    """Номера уровней, для которых есть файл описания"""
+    numbers = []
+    for name in os.listdir(LEVELS_DIR):
+        stem, extension = os.path.splitext(name)
+        if extension == '.json' and stem.startswith('level_') and stem[6:].isdigit():
+            numbers.append(int(stem[6:]))
+    return sorted(numbers)
+
+
+class CollisionGrid:
+    """Равномерная сетка широкой фазы: цели раскладываются по клеткам один раз за тик,
+    а герой проверяется только с теми, кто лежит в тех же клетках"""
+
+    def __init__(self, cell_size=COLLISION_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.last = {}
+        self.totals = {}
+
+    def clear(self):
+        self.cells.clear()
+        self.last = dict.fromkeys(self.last, 0)
+
+    def insert(self, sprite, kind):
+        entry = (kind, sprite)
+        for cell in self._cells(sprite):
+            bucket = self.cells.get(cell)
+            if bucket is None:
+                self.cells[cell] = [entry]
+            else:
+                bucket.append(entry)
+
+    def query(self, sprite):
+        """Кандидаты из общих клеток без повторов, в порядке добавления"""
+        found = {}
+        for cell in self._cells(sprite):
+            for kind, target in self.cells.get(cell, ()):
+                found[id(target)] = (kind, target)
+        self.count("candidates", len(found))
+        return found.values()
+
+    def count(self, name, amount=1):
+        self.last[name] = self.last.get(name, 0) + amount
+        self.totals[name] = self.totals.get(name, 0) + amount
+
+    def stats(self):
+        return {"last_tick": dict(self.last), "total": dict(self.totals), "cells": len(self.cells)}
+
+    def _cells(self, sprite):
+        size = self.cell_size
+        left, right = int(sprite.left // size), int(sprite.right // size)
+        bottom, top = int(sprite.bottom // size), int(sprite.top // size)
+        return [(x, y) for x in range(left, right + 1) for y in range(bottom, top + 1)]
+
+
+class InputRecording:
+    """Запись матча: уровень, зерно и по каждому тику маска зажатых клавиш с контрольной суммой состояния.
+    Файл - короткий заголовок и сжатый zlib массив записей по 6 байт"""
+    MAGIC = b'CUPR'
+    VERSION = 3
+    HEADER = struct.Struct('<4sBBII')
+    TICK = struct.Struct('<HI')
+    KEYS = (arcade.key.LEFT, arcade.key.RIGHT, arcade.key.UP, arcade.key.A, arcade.key.D, arcade.key.W,
+            arcade.key.SPACE, arcade.key.LSHIFT, arcade.key.LCTRL)
+
+    def __init__(self, level, seed):
+        self.level = level
+        self.seed = seed
+        self.masks = []
+        self.checksums = []
+
+    @classmethod
+    def keys_to_mask(cls, keys):
+        return sum(1 << bit for bit, key in enumerate(cls.KEYS) if key in keys)
+
+    @classmethod
+    def mask_to_keys(cls, mask):
+        return {key for bit, key in enumerate(cls.KEYS) if mask & (1 << bit)}
+
+    def record(self, keys, checksum):
+        self.masks.append(self.keys_to_mask(keys))
+        self.checksums.append(checksum)
+
+    def save(self, path):
+        ticks = b''.join(self.TICK.pack(mask, checksum) for mask, checksum in zip(self.masks, self.checksums))
+        with open(path, mode='wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.level, self.seed, len(self.masks)))
+            f.write(zlib.compress(ticks, 9))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, mode='rb') as f:
+            data = f.read()
+        magic, version, level, seed, count = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f"{path}: not a recording of version {cls.VERSION}")
+        recording = cls(level, seed)
+        for mask, checksum in cls.TICK.iter_unpack(zlib.decompress(data[cls.HEADER.size:])):
+            recording.masks.append(mask)
+            recording.checksums.append(checksum)
+        if len(recording.masks) != count:
+            raise ValueError(f"{path}: expected {count} ticks, got {len(recording.masks)}")
+        return recording
+
+
+class ReplayCursor:
+    """Проигрывание записи по тикам со сверкой контрольных сумм"""
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.tick = 0
+        self.diverged_at = None
+
+    @property
+    def finished(self):
+        return self.tick >= len(self.recording.masks)
+
+    def next_keys(self):
+        if self.finished:
+            return set()
+        return InputRecording.mask_to_keys(self.recording.masks[self.tick])
+
+    def check(self, checksum):
+        """Сверяет состояние после тика с записью, о первом расхождении сообщает один раз"""
+        if self.finished:
+            return True
+        expected = self.recording.checksums[self.tick]
+        if checksum != expected and self.diverged_at is None:
+            self.diverged_at = self.tick
+            print(f"replay diverged at tick {self.tick}: checksum {checksum:08x}, recorded {expected:08x}")
+        self.tick += 1
+        return self.diverged_at is None
+
+
+class LevelSimulation:
+    """Логика уровня без окна, звука и отрисовки"""
+
+    def __init__(self, level=None, effects=True, seed=None):
+        self.current_level = level
+        self.level = load_level(level)
+        self.effects = effects
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+
+        self.coin_list = arcade.SpriteList(lazy=True)
+        self.player_list = arcade.SpriteList(lazy=True)
+        self.platform_list = arcade.SpriteList(use_spatial_hash=True, lazy=True)
+        self.gupi_list = arcade.SpriteList(lazy=True)
+        self.particles = ParticleSystem(seed=self.rng.getrandbits(32))
+        self.collisions = CollisionGrid()
+        self.ai = AiScheduler()
+
+        bullet_texture = ASSETS.texture('data/hero/hero_bullet.png')
+        self.bullets = ProjectileSystem({"bullet": ProjectileKind(bullet_texture),
+                                         "bullet_up": ProjectileKind(bullet_texture.rotate_90())}, capacity=16)
+        self.bomb_kind = None
+        self.sound_bomb = None
+        if self.level.has_spawns("bomb"):
+            self.bomb_kind = ProjectileKind(ASSETS.texture('data/enemy/bomb.png'), spin=150,
+                                            bounds=(-math.inf, math.inf, 190, math.inf))
+            self.sound_bomb = ASSETS.sound('data/song/bomb_sound.wav')
+        self.bombs = ProjectileSystem({"bomb": self.bomb_kind} if self.bomb_kind else {})
+        self.coin_pool = SpritePool(Coin, capacity=2)
+        self.coin_animation = ASSETS.animation([f"data/coins/coin{i}.png" for i in range(12)], ANIMATION_SPEED_COIN)
+
+        ASSETS.preload(self.level.assets)
+
+        self.platform_texture = self.level.platform
+        self.background_music = ASSETS.sound(self.level.music)
+        self.level_timer = float(self.level.time_limit or 0)
+        self.timer_running = False
+
+        self.sound_coin = ASSETS.sound("data/coins/voicy_coin.wav")
         self.background_player = None
-        self.sound_before = arcade.load_sound('data/song/sound_before.wav')
+        self.sound_before = ASSETS.sound('data/song/sound_before.wav')
         self.has_sound_before = True
-        self.go_sound = arcade.load_sound('data/song/go_song.wav')
+        self.go_sound = ASSETS.sound('data/song/go_song.wav')
         self.has_go_sound = True
         self.go_sound_timer = 0
-        self.pause_response = arcade.load_sound('data/song/pause_response.wav')
-        self.game_over_sound = arcade.load_sound('data/song/game_over.wav')
-        self.winner_sound = arcade.load_sound('data/song/winner_sound.wav')
-        self.timer_sound = arcade.load_sound('data/song/timer.wav')
-        self.knockout = arcade.load_sound('data/song/knockout.wav')
+        self.knockout = ASSETS.sound('data/song/knockout.wav')
 
         self.countdown_active = True
         self.countdown_value = 4
@@ -1225,9 +2844,6 @@ class MyGame(arcade.View):
         self.game_started = False
         self.game_over = False
 
-        self.textures = []
-        self.frame = 0
-        self.timer = 0
         self.total = 0
 
         self.bombs_destroyed = 0
@@ -1236,39 +2852,45 @@ class MyGame(arcade.View):
         self.gupi_death_timer = None
         self.show_knockout = None
 
+    def release(self):
+        """Останавливает музыку уровня и отдаёт спрайты, пулы и буферы частиц и снарядов"""
+        stop_player(self.background_player)
+        self.background_player = None
+        for sprites in (self.coin_list, self.player_list, self.platform_list, self.gupi_list):
+            sprites.clear()
+        self.coin_pool.free.clear()
+        self.particles.release()
+        self.bullets.release()
+        self.bombs.release()
+        self.ai.clear()
+        self.player = None
+        self.gupi = None
+
+    def pool_stats(self):
+        """Счётчики пулов спрайтов: в установившейся игре allocated не должен расти"""
+        return {
+            "coin": self.coin_pool.stats(),
+        }
+
+    def projectile_stats(self):
+        return {
+            "bullet": self.bullets.stats(),
+            "bomb": self.bombs.stats(),
+        }
+
     def create_explosion_effect(self, x, y):
         """Создает эффект синего взрыва"""
-        for _ in range(30):
-            particle = ExplosionParticle(x, y)
-            self.explosion_particles.append(particle)
+        if not self.effects:
+            return
+        self.particles.emit(x, y)
 
     def setup(self):
-        self.batch = Batch()
-        self.batch_before = Batch()
-        self.batch_timer = Batch()
-        self.total_coins = arcade.Text(f': {str(self.total)}', SCREEN_WIDTH - 100, 45, COLOR,
-                                       25,
-                                       font_name='Gill Sans',
-                                       batch=self.batch)
-
-        if self.current_level == 1:
-            self.timer_text = arcade.Text('', SCREEN_WIDTH // 2, SCREEN_HEIGHT - 50, arcade.color.WHITE,
-                                          30, anchor_x="center", batch=self.batch_timer)
-
         self.player = Hero()
         self.player_list.append(self.player)
 
         self.texture_hp = self.player.texture_hp
 
-        for i in range(12):
-            texture = arcade.load_texture(f"data/coins/coin{i}.png")
-            self.textures.append(texture)
-
-        coin = arcade.Sprite()
-        coin.scale = 1.3
-        coin.texture = self.textures[0]
-        coin.center_x = SCREEN_WIDTH // 2
-        coin.center_y = SCREEN_HEIGHT // 5.1
+        coin = self.coin_pool.acquire(self.coin_animation.frames[0], SCREEN_WIDTH // 2, SCREEN_HEIGHT // 5.1)
         self.coin_list.append(coin)
 
         self.keys_pressed = set()
@@ -1280,9 +2902,12 @@ class MyGame(arcade.View):
             platforms=self.platform_list,
             gravity_constant=GRAVITY
         )
-        if self.current_level == 2:
-            self.gupi = EnemyGupi()
+        self.gupi = None
+        self.ai.clear()
+        if self.level.boss:
+            self.gupi = BOSSES[self.level.boss]()
             self.gupi_list.append(self.gupi)
+            self.ai.add(self.gupi)
 
         self.countdown_active = True
         self.countdown_value = 4
@@ -1290,12 +2915,10 @@ class MyGame(arcade.View):
         self.game_started = False
         self.game_over = False
 
-        self.last_stage = None
-
         self.is_win = None
 
-        self.timer_bomb = 0.0
-        self.timer_bomb_end = 0.0
+        self.level_time = 0.0
+        self.spawn_index = 0
 
         self.bombs_destroyed = 0
 
@@ -1307,90 +2930,10 @@ class MyGame(arcade.View):
 
         self.has_sound_before = True
 
-    def on_draw(self):
-        self.clear()
-        self.camera.use()
-        self.camera.position = (SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
-        arcade.draw_texture_rect(self.texture_background,
-                                 arcade.rect.XYWH(self.center_x, self.center_y + 150, SCREEN_WIDTH, SCREEN_HEIGHT))
-        arcade.draw_texture_rect(self.texture_table, arcade.rect.XYWH(self.center_x, 150, 1440, 297))
-        arcade.draw_texture_rect(self.player.texture_hp, arcade.rect.XYWH(100, 60, 100, 50))
-        arcade.draw_texture_rect(self.coin_texture, arcade.rect.XYWH(SCREEN_WIDTH - 120, 60, 44, 57))
-        self.coin_list.draw()
-        self.platform_list.draw()
-        self.player_list.draw()
-        self.bullet_list.draw()
-        self.gupi_list.draw()
-        if self.show_knockout and self.game_over_timer < 0.3:
-            arcade.draw_texture_rect(self.knockout_texture,
-                                     arcade.rect.XYWH(self.center_x, self.center_y, SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.bomb_list.draw()
-        self.batch.draw()
-        self.explosion_particles.draw()
-        self.tv_effect.draw()
-
-        if self.current_level == 1 and self.game_started and not self.game_over:
-            minutes = int(self.level_timer) // 60
-            seconds = int(self.level_timer) % 60
-            timer_str = f"{minutes:02d}:{seconds:02d}"
-
-            if self.level_timer <= 10:
-                color = arcade.color.RED
-            elif self.level_timer <= 30:
-                color = arcade.color.YELLOW
-            else:
-                color = arcade.color.WHITE
-
-            timer = arcade.Text(timer_str, SCREEN_WIDTH // 2, SCREEN_HEIGHT - 50, color,
-                                30, anchor_x="center", font_name="Gill Sans", bold=True, batch=self.batch_timer)
-            self.batch_timer.draw()
-
-        if self.countdown_active:
-            arcade.draw_rect_filled(arcade.rect.XYWH(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, SCREEN_WIDTH, SCREEN_HEIGHT),
-                                    (0, 0, 0, 100))
-            current_stage = None
-            if self.countdown_value > 1:
-                current_stage = f"number_{self.countdown_value - 1}"
-                self.text = str(self.countdown_value - 1)
-                self.color = arcade.color.RED
-                self.font_size = 200
-            elif self.countdown_value == 1:
-                current_stage = "ready"
-                self.text = "Ready?"
-                self.color = arcade.color.YELLOW
-                self.font_size = 120
-
-            if hasattr(self, 'last_stage') and self.last_stage != current_stage:
-                self.timer_sound.play()
-
-            self.last_stage = current_stage
-
-            number = arcade.Text(
-                self.text,
-                SCREEN_WIDTH / 2,
-                SCREEN_HEIGHT / 2,
-                self.color,
-                self.font_size,
-                anchor_x="center",
-                anchor_y="center",
-                font_name="Gill Sans",
-                bold=True,
-                batch=self.batch_before
-            )
-            self.batch_before.draw()
-
-    def on_update(self, delta_time):
-        self.tv_effect.update()
+    def step(self, delta_time):
+        """Один тик логики уровня"""
         if self.game_over:
             self.game_over_timer += delta_time
-            if self.game_over_timer >= 2:
-                if self.is_win:
-                    sound_to_play = self.winner_sound
-                else:
-                    sound_to_play = self.game_over_sound
-
-                game_over_view = GameOverView(self, sound_to_play, is_win=self.is_win)
-                self.window.show_view(game_over_view)
             return
 
         if self.countdown_active:
@@ -1408,14 +2951,15 @@ class MyGame(arcade.View):
                     self.go_sound.play()
                     self.countdown_active = False
                     self.game_started = True
-                    self.background_player = arcade.play_sound(self.background_music, loop=True, volume=0.5)
-                    if self.current_level == 1:
-                        self.timer_running = True
+                    self.background_player = self.background_music.play(loop=True, volume=0.5)
+                    self.timer_running = self.level.time_limit is not None
             return
 
         if self.game_started and not self.game_over:
-            self.explosion_particles.update(delta_time)
-            if self.current_level == 1 and self.timer_running:
+            self.level_time += delta_time
+            with PROFILER.scope("update.particles"):
+                self.particles.update(delta_time)
+            if self.timer_running:
                 self.level_timer -= delta_time
                 if self.level_timer <= 0:
                     self.level_timer = 0
@@ -1423,61 +2967,29 @@ class MyGame(arcade.View):
                     self.show_game_over(is_win=True)
                     return
 
-            if not self.player.is_dashing:
-                self.physics_engine.update()
-            self.player_list.update(delta_time, self.keys_pressed, self.bullet_list, self.platform_list, self.bomb_list,
-                                    self, self.gupi_list)
-            self.player_list.update_animation(delta_time)
-            self.bullet_list.update(delta_time, self.bomb_list)
-            self.bomb_list.update(delta_time)
-            self.gupi_list.update(delta_time, self.bullet_list, self.player)
-            self.gupi_list.update_animation(delta_time)
-
-            for bomb in self.bomb_list:
-                bomb.update_animation(delta_time)
-
-            if self.current_level == 1:
-                self.timer_bomb += delta_time
-                self.timer_bomb_end += delta_time
-                if self.timer_bomb >= 0.2:
-                    self.timer_bomb = 0.0
-                    bomb = EnemyBomb(random.randint(100, SCREEN_WIDTH - 100), SCREEN_HEIGHT, 500)
-                    bomb.center_y = SCREEN_HEIGHT + bomb.height
-                    self.bomb_list.append(bomb)
-
-            self.timer += delta_time
-            if self.timer >= ANIMATION_SPEED_COIN:
-                self.timer -= ANIMATION_SPEED_COIN
-                self.frame = (self.frame + 1) % 12
-                self.coin_list[0].texture = self.textures[self.frame]
-
-            is_collision = arcade.check_for_collision_with_list(self.player, self.coin_list)
-            for i in is_collision:
-                self.total += 1
-                self.sound_coin.play()
-                self.total_coins = arcade.Text(f': {str(self.total)}', SCREEN_WIDTH - 100, 45, COLOR,
-                                               25,
-                                               font_name='Gill Sans',
-                                               batch=self.batch)
-                i.remove_from_sprite_lists()
-
-                for j in range(12):
-                    texture = arcade.load_texture(f"data/coins/coin{j}.png")
-                    self.textures.append(texture)
-
-                coin = arcade.Sprite()
-                coin.scale = 1.3
-                coin.texture = self.textures[0]
-                coin.center_x = random.randint(0 + self.textures[0].width, SCREEN_WIDTH - self.textures[0].width)
-                coin.center_y = SCREEN_HEIGHT // 5.1
-
-                for _ in range(10):
-                    if (self.player.center_x - self.player.width // 2 - 120) <= coin.center_x <= (
-                            self.player.center_x + self.player.width // 2 + 120):
-                        coin.center_x = random.randint(int(coin.width // 2), SCREEN_WIDTH - int(coin.width // 2))
-                self.coin_list.append(coin)
-
-        if self.current_level == 2:
+            with PROFILER.scope("update.collisions"):
+                self.resolve_collisions()
+            with PROFILER.scope("update.physics"):
+                if not self.player.is_dashing:
+                    self.physics_engine.update()
+            with PROFILER.scope("update.hero"):
+                self.player_list.update(delta_time, self.keys_pressed, self.bullets, self.platform_list)
+                self.player_list.update_animation(delta_time, self.level_time)
+            with PROFILER.scope("update.projectiles"):
+                self.bullets.update(delta_time)
+                self.bombs.update(delta_time)
+            with PROFILER.scope("update.ai"):
+                self.ai.update(delta_time)
+            with PROFILER.scope("update.gupi"):
+                self.gupi_list.update(delta_time, self.player)
+                self.gupi_list.update_animation(delta_time, self.level_time)
+
+            self.run_timeline()
+
+            with PROFILER.scope("update.coins"):
+                self.update_coins(delta_time)
+
+        if self.gupi is not None:
             if self.gupi.health <= 0 and not self.game_over:
                 self.gupi.center_y = 350
                 if self.gupi_death_timer is None:
@@ -1488,6 +3000,104 @@ class MyGame(arcade.View):
                 if self.gupi_death_timer >= 0.5:
                     self.show_game_over(is_win=True)
 
+    def run_timeline(self):
+        """Появления по расписанию уровня: курсор только идёт вперёд, за тик проверяется одно время"""
+        timeline = self.level.timeline
+        while self.spawn_index < len(timeline) and timeline[self.spawn_index][0] <= self.level_time:
+            _, kind, params = timeline[self.spawn_index]
+            self.spawn_index += 1
+            self.spawn(kind, params)
+
+    def spawn(self, kind, params):
+        if kind == "bomb":
+            self.bombs.spawn("bomb", self.rng.randint(100, SCREEN_WIDTH - 100),
+                             SCREEN_HEIGHT + self.bomb_kind.texture.height, velocity_y=-params["speed"])
+
+    def resolve_collisions(self):
+        """Все столкновения тика за один проход. Босс и монеты раскладываются по сетке, бомбы и пули
+        проверяются по массивам снарядов. Герой проверяется первым, как и раньше;
+        пуля взрывает все бомбы, которых касается"""
+        grid = self.collisions
+        grid.clear()
+        for gupi in self.gupi_list:
+            grid.insert(gupi, Collider.BOSS)
+        for coin in self.coin_list:
+            grid.insert(coin, Collider.COIN)
+
+        removed_bombs = set()
+        hero = self.player
+        if hero.health > 0:
+            for bomb in self.bombs.hits(hero):
+                grid.count("hero_bomb")
+                removed_bombs.add(bomb)
+                hero.hit_by_bomb()
+            for kind, target in grid.query(hero):
+                if not arcade.check_for_collision(hero, target):
+                    continue
+                if kind is Collider.BOSS:
+                    grid.count("hero_boss")
+                    hero.hit_by_boss()
+                else:
+                    grid.count("hero_coin")
+                    self.collect_coin(target)
+
+        boss_hits = [(gupi, set(self.bullets.hits(gupi))) for gupi in self.gupi_list]
+        bomb_hits = {}
+        for bullet, bomb in self.bullets.overlaps(self.bombs):
+            bomb_hits.setdefault(bullet, []).append(bomb)
+        removed_bullets = []
+        for bullet in sorted(bomb_hits.keys() | set().union(*(hits for gupi, hits in boss_hits))):
+            bombs = [bomb for bomb in bomb_hits.get(bullet, ()) if bomb not in removed_bombs]
+            if bombs:
+                for bomb in bombs:
+                    grid.count("bullet_bomb")
+                    removed_bombs.add(bomb)
+                    self.create_explosion_effect(*self.bombs.position[bomb].tolist())
+                    self.bombs_destroyed += 1
+                    MIXER.play(self.sound_bomb, "explosion", volume=0.8)
+                removed_bullets.append(bullet)
+                continue
+            for gupi, hits in boss_hits:
+                if bullet in hits and gupi.health > 0:
+                    grid.count("bullet_boss")
+                    self.create_explosion_effect(*self.bullets.position[bullet].tolist())
+                    gupi.hit_by_bullet()
+                    removed_bullets.append(bullet)
+                    break
+        self.bombs.remove(removed_bombs)
+        self.bullets.remove(removed_bullets)
+
+        if hero.health <= 0 and not self.game_over:
+            self.show_game_over(is_win=False)
+            MIXER.play(hero.death_sound, "hero", priority=3)
+
+    def collision_stats(self):
+        return self.collisions.stats()
+
+    def update_coins(self, delta_time):
+        """Анимация монет"""
+        animate(self.coin_list, self.coin_animation, self.level_time)
+
+    def collect_coin(self, collected):
+        """Подбор монеты: новая появляется подальше от героя"""
+        self.total += 1
+        MIXER.play(self.sound_coin, "pickup")
+        self.on_coin_collected()
+        collected.retire()
+
+        first_frame = self.coin_animation.frames[0]
+        coin = self.coin_pool.acquire(
+            first_frame,
+            self.rng.randint(0 + first_frame.width, SCREEN_WIDTH - first_frame.width),
+            SCREEN_HEIGHT // 5.1
+        )
+
+        for _ in range(10):
+            if (self.player.center_x - self.player.width // 2 - 120) <= coin.center_x <= (
+                    self.player.center_x + self.player.width // 2 + 120):
+                coin.center_x = self.rng.randint(int(coin.width // 2), SCREEN_WIDTH - int(coin.width // 2))
+        self.coin_list.append(coin)
+
     def show_game_over(self, is_win=False):
         """Показать экран Game Over"""
         if not self.game_over:
@@ -1496,38 +3106,38 @@ class MyGame(arcade.View):
             self.game_over_timer = 0.0
             self.is_win = is_win
             if not self.is_win:
-                self.player.texture_hp = arcade.load_texture('data/HP_table/hp_dead.png')
+                self.player.texture_hp = ASSETS.texture('data/HP_table/hp_dead.png')
 
     def platform_create(self):
         """Создание плит"""
-        start_x = random.randint(150, 400)
-        start_y = random.randint(350, 450)
+        start_x = self.rng.randint(150, 400)
+        start_y = self.rng.randint(350, 450)
 
         patterns = [
             [0, 1, -1],
             [0, -1, 1],
         ]
 
-        pattern = random.choice(patterns)
+        pattern = self.rng.choice(patterns)
 
         max_jump_height = 300
 
         for i in range(3):
-            platform = arcade.Sprite(self.platform_texture, scale=1.0)
+            platform = arcade.Sprite(ASSETS.texture(self.platform_texture), scale=1.0)
 
             if i == 0:
                 platform.center_x = start_x
             else:
                 prev_platform = self.platform_list[i - 1]
-                distance_x = random.randint(400, 550)
+                distance_x = self.rng.randint(400, 550)
                 platform.center_x = prev_platform.center_x + distance_x
 
-            platform.center_x += random.randint(-40, 40)
+            platform.center_x += self.rng.randint(-40, 40)
 
             if i == 0:
                 platform.center_y = max(350, start_y)
             else:
-                height_change = random.randint(150, 250)
+                height_change = self.rng.randint(150, 250)
                 direction = pattern[i]
                 prev_platform = self.platform_list[i - 1]
 
@@ -1588,18 +3198,18 @@ class MyGame(arcade.View):
 
             self.platform_list.append(platform)
 
-    def on_key_press(self, key, modifiers):
+    def on_coin_collected(self):
+        """Вызывается после подбора монеты"""
+
+    def press_key(self, key):
+        """Нажатие игровой клавиши"""
         if not self.game_started or self.game_over:
             return
         self.keys_pressed.add(key)
-        if key == arcade.key.ESCAPE:
-            self.pause_response.play()
-            pause_view = PauseView(self, self.background_player)
-            self.window.show_view(pause_view)
         if key == arcade.key.SPACE and not self.player.is_dashing:
             if ((self.player.is_on_ground or self.player.is_on_platform or self.player.can_coyote_jump)
                     and not self.player.is_jump):
-                self.player.jump_sound.play(volume=2)
+                MIXER.play(self.player.jump_sound, "hero", priority=1, volume=2)
                 self.player.change_y = PLAYER_JUMP_SPEED
                 self.player.is_jump = True
                 self.player.is_on_ground = False
@@ -1610,23 +3220,339 @@ class MyGame(arcade.View):
                 self.player.was_on_platform = False
             elif self.player.can_double_jump and not self.player.has_double_jump and not (
                     self.player.is_on_ground or self.player.is_on_platform):
-                self.player.jump_sound.play(volume=2)
+                MIXER.play(self.player.jump_sound, "hero", priority=1, volume=2)
                 self.player.can_double_jump = False
                 self.player.has_double_jump = True
                 self.player.change_y = PLAYER_JUMP_SPEED * 0.7
         if key == arcade.key.LSHIFT:
             self.player.dash()
 
-    def on_key_release(self, key, modifiers):
+    def release_key(self, key):
+        """Отпускание игровой клавиши"""
         if not self.game_started or self.game_over:
             return
         if key in self.keys_pressed:
             self.keys_pressed.remove(key)
 
+    def state_checksum(self):
+        """CRC32 всего, что влияет на ход матча; по нему replay находит первый разошедшийся тик"""
+        player = self.player
+        values = [self.level_time, self.level_timer, self.total, self.bombs_destroyed, self.spawn_index,
+                  player.center_x, player.center_y, player.change_x, player.change_y, player.health]
+        for projectiles in (self.bullets, self.bombs):
+            values.append(projectiles.count)
+            values.extend(projectiles.position[:projectiles.count].ravel().tolist())
+        for sprite_list in (self.coin_list, self.gupi_list):
+            values.append(len(sprite_list))
+            for sprite in sprite_list:
+                values.append(sprite.center_x)
+                values.append(sprite.center_y)
+        if self.gupi is not None:
+            values.append(self.gupi.health)
+        return zlib.crc32(struct.pack(f'<{len(values)}d', *values))
+
+    def set_keys(self, keys):
+        """Приводит зажатые клавиши к заданному множеству через press_key/release_key"""
+        keys = set(keys)
+        for key in self.keys_pressed - keys:
+            self.release_key(key)
+        for key in keys - self.keys_pressed:
+            self.press_key(key)
+
+
+class MyGame(LevelSimulation, Screen):
+    def __init__(self, level=None, seed=None, replay=None):
+        Screen.__init__(self)
+        LevelSimulation.__init__(self, level, seed=seed)
+        self.camera = arcade.Camera2D()
+        self.camera.position = (SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
+
+        self.tv_effect = TVEffect(SCREEN_WIDTH, SCREEN_HEIGHT)
+
+        self.texture_background = ASSETS.texture(self.level.background)
+        self.texture_table = ASSETS.texture(self.level.table)
+        self.knockout_texture = ASSETS.texture(self.level.knockout) if self.level.knockout else None
+        self.static_layer = self.build_static_layer()
+
+        self.pause_response = ASSETS.sound('data/song/pause_response.wav')
+        self.game_over_sound = ASSETS.sound('data/song/game_over.wav')
+        self.winner_sound = ASSETS.sound('data/song/winner_sound.wav')
+        self.timer_sound = ASSETS.sound('data/song/timer.wav')
+
+        self.accumulator = 0.0
+        self.previous_positions = {}
+
+        self.held_keys = set()
+        self.tapped_keys = set()
+        self.replay = replay
+        self.recording = InputRecording(level, self.seed) if RECORDING_PATH and replay is None else None
+
+    def setup(self):
+        self.hud = Hud()
+        LevelSimulation.setup(self)
+
+    def on_coin_collected(self):
+        self.hud.set_coins(self.total)
+
+    def build_static_layer(self):
+        """Фон и стол уровня одним списком спрайтов: вершины лежат на GPU, кадр рисует их одним вызовом"""
+        layer = arcade.SpriteList()
+        for texture, x, y, width, height in ((self.texture_background, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + 150,
+                                              SCREEN_WIDTH, SCREEN_HEIGHT),
+                                             (self.texture_table, SCREEN_WIDTH / 2, 150, 1440, 297)):
+            sprite = arcade.Sprite(texture, center_x=x, center_y=y)
+            sprite.size = (width, height)
+            layer.append(sprite)
+        return layer
+
+    def interpolated_lists(self):
+        return self.player_list, self.gupi_list
+
+    def remember_positions(self):
+        """Запоминает позиции перед тиком, чтобы сгладить их при отрисовке"""
+        self.previous_positions = {sprite: sprite.position
+                                   for sprites in self.interpolated_lists() for sprite in sprites}
+        self.bullets.remember()
+        self.bombs.remember()
+
+    def interpolate_positions(self, alpha):
+        """Ставит спрайты между прошлым и текущим тиком, возвращает позиции для восстановления"""
+        restore = []
+        for sprites in self.interpolated_lists():
+            for sprite in sprites:
+                previous = self.previous_positions.get(sprite)
+                if previous is None:
+                    continue
+                current = sprite.position
+                restore.append((sprite, current))
+                sprite.position = (previous[0] + (current[0] - previous[0]) * alpha,
+                                   previous[1] + (current[1] - previous[1]) * alpha)
+        return restore
+
+    def on_draw(self):
+        with PROFILER.scope("draw"):
+            self.draw_frame()
+        PROFILER.draw_overlay()
+        PROFILER.end_frame()
+
+    def draw_frame(self):
+        """Уровень между прошлым и текущим тиком, без оверлея профайлера"""
+        alpha = self.accumulator / SIMULATION_STEP
+        restore = self.interpolate_positions(alpha)
+        self.draw_level(alpha)
+        for sprite, position in restore:
+            sprite.position = position
+
+    def draw_level(self, alpha=1.0):
+        self.clear()
+        self.camera.use()
+        with PROFILER.scope("draw.background"):
+            self.static_layer.draw()
+        with PROFILER.scope("draw.sprites"):
+            self.coin_list.draw()
+            self.platform_list.draw()
+            self.player_list.draw()
+            self.bullets.draw(alpha)
+            self.gupi_list.draw()
+            if self.show_knockout and self.game_over_timer < 0.3:
+                arcade.draw_texture_rect(self.knockout_texture,
+                                         arcade.rect.XYWH(self.center_x, self.center_y, SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.bombs.draw(alpha)
+        with PROFILER.scope("draw.hud"):
+            self.draw_hud()
+        with PROFILER.scope("draw.particles"):
+            self.particles.draw()
+        with PROFILER.scope("draw.tv_effect"):
+            self.tv_effect.draw()
+        if self.countdown_active:
+            with PROFILER.scope("draw.countdown"):
+                self.draw_countdown()
+
+    def draw_hud(self):
+        """HP, монеты и таймер уровня"""
+        self.hud.set_hp(self.player.texture_hp)
+        show_timer = self.level.time_limit is not None and self.game_started and not self.game_over
+        self.hud.show_timer(show_timer)
+        if show_timer:
+            self.hud.set_timer(self.level_timer)
+        self.hud.draw()
+
+    def draw_countdown(self):
+        """Обратный отсчёт перед началом уровня"""
+        if self.hud.set_countdown(self.countdown_value):
+            self.timer_sound.play()
+        self.hud.draw_countdown()
+
+    def on_update(self, delta_time):
+        """Логика идёт фиксированными тиками независимо от частоты кадров"""
+        self.accumulator += min(delta_time, MAX_FRAME_TIME)
+        while self.accumulator >= SIMULATION_STEP:
+            keys = self.next_keys()
+            self.remember_positions()
+            with PROFILER.scope("update"):
+                self.set_keys(keys)
+                self.step(SIMULATION_STEP)
+            self.accumulator -= SIMULATION_STEP
+            if self.recording is not None:
+                self.recording.record(keys, self.state_checksum())
+            elif self.replay is not None:
+                self.replay.check(self.state_checksum())
+        if self.game_over and self.game_over_timer >= 2:
+            if self.is_win:
+                sound_to_play = self.winner_sound
+            else:
+                sound_to_play = self.game_over_sound
+
+            game_over_view = GameOverView(self, sound_to_play, is_win=self.is_win)
+            self.show(game_over_view)
+
+    def next_keys(self):
+        """Клавиши на следующий тик: из записи или зажатые сейчас плюс нажатые и отпущенные между тиками"""
+        if self.replay is not None:
+            return self.replay.next_keys()
+        keys = self.held_keys | self.tapped_keys
+        self.tapped_keys.clear()
+        return keys
+
+    def on_hide_view(self):
+        if self.recording is not None:
+            self.recording.save(RECORDING_PATH)
+
+    def on_exit(self, next_view):
+        """Пауза и экран итогов держат уровень у себя и освобождают его сами"""
+        if getattr(next_view, "game_view", None) is not self:
+            self.release()
+
+    def release(self):
+        LevelSimulation.release(self)
+        self.static_layer.clear()
+        self.hud = None
+        self.previous_positions = {}
+
+    def on_key_press(self, key, modifiers):
+        if key == arcade.key.F3:
+            PROFILER.toggle_overlay()
+            return
+        if not self.game_started or self.game_over:
+            return
+        if key == arcade.key.ESCAPE:
+            MIXER.play(self.pause_response, "ui")
+            self.held_keys.clear()
+            pause_view = PauseView(self, self.background_player)
+            self.show(pause_view)
+            return
+        if key in InputRecording.KEYS:
+            self.held_keys.add(key)
+            self.tapped_keys.add(key)
+
+    def on_key_release(self, key, modifiers):
+        self.held_keys.discard(key)
+
+
+class HeadlessRunner:
+    """Прогон уровня без окна, звука и GL-контекста"""
+
+    def __init__(self, level, delta_time=SIMULATION_STEP, seed=None, effects=False):
+        ASSETS.silent = True
+        self.delta_time = delta_time
+        self.ticks = 0
+        self.simulation = LevelSimulation(level, effects=effects, seed=seed)
+        self.simulation.setup()
+
+    @property
+    def finished(self):
+        return self.simulation.game_over and self.simulation.game_over_timer >= 2
+
+    def tick(self, keys=()):
+        """Один тик: keys - множество клавиш, зажатых на этом тике"""
+        self.simulation.set_keys(keys)
+        self.simulation.step(self.delta_time)
+        self.ticks += 1
+
+    def run(self, key_stream):
+        """Прогоняет поток нажатий, пока он не кончится или уровень не завершится"""
+        for keys in key_stream:
+            if self.finished:
+                break
+            self.tick(keys)
+        return self.simulation
+
+
+def run_headless(level, seconds=90.0):
+    """Запуск уровня без окна из командной строки"""
+    runner = HeadlessRunner(level, seed=0)
+    ticks = int(seconds / runner.delta_time)
+    start = time.perf_counter()
+    simulation = runner.run({arcade.key.LCTRL} for _ in range(ticks))
+    elapsed = time.perf_counter() - start
+    simulated = runner.ticks * runner.delta_time
+    print(f"level {level}: {runner.ticks} ticks, {simulated:.1f} s simulated in {elapsed:.2f} s "
+          f"({simulated / max(elapsed, 1e-9):.0f}x), coins {simulation.total}, "
+          f"bombs destroyed {simulation.bombs_destroyed}, hp {simulation.player.health}")
+
+
+def run_replay(path):
+    """Проигрывание записи без окна с максимальной скоростью, True если состояние нигде не разошлось"""
+    recording = InputRecording.load(path)
+    runner = HeadlessRunner(recording.level, seed=recording.seed)
+    cursor = ReplayCursor(recording)
+    start = time.perf_counter()
+    while not cursor.finished:
+        runner.tick(cursor.next_keys())
+        if not cursor.check(runner.simulation.state_checksum()):
+            break
+    elapsed = time.perf_counter() - start
+    simulated = runner.ticks * runner.delta_time
+    print(f"replay {path}: level {recording.level}, {runner.ticks}/{len(recording.masks)} ticks, "
+          f"{simulated:.1f} s simulated in {elapsed:.2f} s, "
+          f"{'diverged' if cursor.diverged_at is not None else 'identical'}")
+    return cursor.diverged_at is None
+
+
+def check_level_assets():
+    """Собирает каждый уровень в скрытом окне и печатает файлы, которые сборка берёт мимо списка assets,
+    True если списки полные"""
+    ASSETS.silent = True
+    arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE, visible=False)
+    complete = True
+    for number in available_levels():
+        level = load_level(number)
+        game_view, unlisted = ASSETS.unlisted(level.assets, lambda: Levels.build_level(number))
+        game_view.release()
+        if unlisted:
+            complete = False
+            print(f"level {number}: not in assets: {', '.join(unlisted)}")
+        else:
+            print(f"level {number}: assets list complete")
+    return complete
+
 
 if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--headless':
+        run_headless(int(sys.argv[2]), float(sys.argv[3]) if len(sys.argv) > 3 else 90.0)
+        sys.exit(0)
+    replay_path = sys.argv[sys.argv.index('--replay') + 1] if '--replay' in sys.argv else None
+    if replay_path and '--fast' in sys.argv:
+        sys.exit(0 if run_replay(replay_path) else 1)
+    if '--check-assets' in sys.argv:
+        sys.exit(0 if check_level_assets() else 1)
+    if '--record' in sys.argv:
+        RECORDING_PATH = sys.argv[sys.argv.index('--record') + 1]
+    if '--trace' in sys.argv:
+        PROFILER.start_trace(sys.argv[sys.argv.index('--trace') + 1])
+    STARTUP.enabled = '--startup-report' in sys.argv
+    LEAKS.enabled = '--debug-views' in sys.argv
+    STARTUP.mark("module setup")
     create_music_log()
     window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
-    menu_view = MenuView()
-    window.show_view(menu_view)
+    STARTUP.mark("window")
+    if replay_path:
+        recording = InputRecording.load(replay_path)
+        replay_view = MyGame(level=recording.level, seed=recording.seed, replay=ReplayCursor(recording))
+        replay_view.setup()
+        window.show_view(replay_view)
+    else:
+        window.show_view(VIEWS.get(MenuView))
+    STARTUP.mark("menu")
     arcade.run()
+    PROFILER.dump_trace()